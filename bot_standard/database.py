@@ -3,50 +3,245 @@
 Enhanced AsyncPostgreSQL Database Adapter
 Matches actual Nongor database schema with advanced features
 """
+import asyncio
 import asyncpg
+import functools
 import logging
+import os
 import re
+import time
 import httpx
 from typing import Dict, Any, Optional
 from urllib.parse import urlparse
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+def ttl_cache(seconds, maxsize=128):
+    """
+    Cache an async Database method's result per arguments for `seconds`.
+    Each method keeps at most `maxsize` entries (least recently used evicted).
+    None results (not found) are not cached, and neither is anything computed
+    while a query failed or the circuit breaker was open: the fetch helpers turn
+    errors into None/[] and those fallbacks must not outlive the outage.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            entries = self._cache.setdefault(func.__name__, OrderedDict())
+            key = (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            entry = entries.get(key)
+            if entry and entry[0] > now:
+                entries.move_to_end(key)
+                return entry[1]
+            errors_before = self._query_errors
+            result = await func(self, *args, **kwargs)
+            if result is not None and self._query_errors == errors_before and not self._circuit_open():
+                entries[key] = (now + seconds, result)
+                entries.move_to_end(key)
+                if len(entries) > maxsize:
+                    entries.popitem(last=False)
+            return result
+        return wrapper
+    return decorator
+
+# Circuit breaker: after this many consecutive connection failures, fail fast for the cooldown
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN_SECONDS = 5
+CONNECTION_ERRORS = (OSError, asyncio.TimeoutError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError)
+
+# Today / last 7 days / last 30 days sales in one pass (shared by period stats and the dashboard)
+PERIOD_SALES_QUERY = """
+    SELECT 
+        COUNT(*) FILTER (WHERE created_at >= CURRENT_DATE) as today_count,
+        COALESCE(SUM(total_price) FILTER (WHERE created_at >= CURRENT_DATE), 0) as today_revenue,
+        COALESCE(AVG(total_price) FILTER (WHERE created_at >= CURRENT_DATE), 0) as today_avg,
+        COUNT(*) FILTER (WHERE created_at >= CURRENT_DATE - INTERVAL '7 days') as weekly_count,
+        COALESCE(SUM(total_price) FILTER (WHERE created_at >= CURRENT_DATE - INTERVAL '7 days'), 0) as weekly_revenue,
+        COALESCE(AVG(total_price) FILTER (WHERE created_at >= CURRENT_DATE - INTERVAL '7 days'), 0) as weekly_avg,
+        COUNT(*) as monthly_count,
+        COALESCE(SUM(total_price), 0) as monthly_revenue,
+        COALESCE(AVG(total_price), 0) as monthly_avg
+    FROM orders 
+    WHERE created_at >= CURRENT_DATE - INTERVAL '30 days'
+    AND status != 'Cancelled'
+"""
+
+# Everything the admin dashboard shows, as one statement
+DASHBOARD_BUNDLE_QUERY = """
+    WITH sales AS (
+        """ + PERIOD_SALES_QUERY + """
+    ),
+    user_counts AS (
+        SELECT 
+            COUNT(*) as total_users,
+            COUNT(*) FILTER (WHERE last_seen > CURRENT_DATE - INTERVAL '7 days') as active_users
+        FROM users
+    ),
+    pending AS (
+        SELECT COUNT(*) as pending_count
+        FROM orders
+        WHERE status = 'Pending' OR delivery_status = 'Pending'
+    ),
+    low_stock AS (
+        SELECT COUNT(*) as low_stock_count
+        FROM products
+        WHERE is_active = TRUE 
+        AND stock_quantity < $1
+    )
+    SELECT * FROM sales, user_counts, pending, low_stock
+"""
+
+def _split_period_stats(row):
+    """Split a PERIOD_SALES_QUERY row into {'today'|'weekly'|'monthly': stats dict}."""
+    return {
+        period: {
+            'order_count': row[f'{period}_count'] if row else 0,
+            'total_revenue': row[f'{period}_revenue'] if row else 0,
+            'avg_order_value': row[f'{period}_avg'] if row else 0
+        }
+        for period in ('today', 'weekly', 'monthly')
+    }
+
 class Database:
     """
     AsyncPostgreSQL database adapter with enhanced features.
     Matches actual Nongor schema: orders, products, order_items, coupons, users
     """
     
-    def __init__(self, connection_string):
+    def __init__(self, connection_string, min_pool_size=2, max_pool_size=10):
         self.connection_string = connection_string
+        self.min_pool_size = min_pool_size
+        self.max_pool_size = max_pool_size
         self.pool = None
+        self._connect_lock = asyncio.Lock()
+        self._http = None  # Shared httpx client (keep-alive) for the analytics API
+        self._listen_conn = None  # Dedicated connection for LISTEN (outside the pool)
+        self._listeners = {}  # channel -> NOTIFY callback, re-subscribed after reconnects
+        self._relisten_task = None
+        self._closing = False
+        self._cache = {}  # ttl_cache: method name -> OrderedDict(args -> (expires_at, result))
+        self._failures = 0  # Consecutive connection failures
+        self._query_errors = 0  # Total failed/skipped queries; ttl_cache skips results computed across a bump
+        self._open_until = 0.0  # Circuit open (queries skipped) until this monotonic time
+
+    def invalidate_cache(self, *methods):
+        """Drop cached results of the named methods, or of all methods if none are given."""
+        if not methods:
+            self._cache.clear()
+        for name in methods:
+            self._cache.pop(name, None)
 
     async def connect(self):
         """Initialize connection pool"""
-        if not self.pool:
+        if self.pool:
+            return
+        # Concurrent first queries must not each open their own pool
+        async with self._connect_lock:
+            if self.pool:
+                return
             try:
                 # SSL is required for Neon - use 'require' for proper cert validation
                 self.pool = await asyncpg.create_pool(
                     self.connection_string,
-                    min_size=1,
-                    max_size=5,
+                    min_size=self.min_pool_size,
+                    max_size=self.max_pool_size,
                     ssl='require'
                 )
-                logger.info("Database connection pool established.")
+                logger.info(f"Database connection pool established ({self.min_pool_size}-{self.max_pool_size} connections).")
             except Exception as e:
                 logger.error(f"Failed to connect to database: {e}")
                 raise e
 
+    async def listen(self, channel, callback):
+        """
+        LISTEN on `channel`; callback(connection, pid, channel, payload) runs per NOTIFY.
+        Returns False if notifications are unavailable (e.g. behind a transaction pooler).
+        """
+        self._listeners[channel] = callback
+        try:
+            if self._listen_conn is None or self._listen_conn.is_closed():
+                await self._open_listen_conn()
+            else:
+                await self._listen_conn.add_listener(channel, callback)
+            logger.info(f"Listening for '{channel}' notifications.")
+            return True
+        except Exception as e:
+            logger.warning(f"LISTEN {channel} unavailable, relying on polling/TTL caches: {e}")
+            return False
+
+    async def _open_listen_conn(self):
+        """Open the LISTEN connection and subscribe every registered channel."""
+        conn = await asyncpg.connect(self.connection_string, ssl='require')
+        conn.add_termination_listener(self._on_listen_terminated)
+        for channel, callback in self._listeners.items():
+            await conn.add_listener(channel, callback)
+        self._listen_conn = conn
+
+    def _on_listen_terminated(self, connection):
+        """LISTEN connection dropped: reconnect in the background unless shutting down."""
+        if self._closing or (self._relisten_task and not self._relisten_task.done()):
+            return
+        logger.warning("LISTEN connection lost; reconnecting (polling/TTL caches cover the gap).")
+        self._relisten_task = asyncio.get_running_loop().create_task(self._relisten())
+
+    async def _relisten(self, max_delay=60):
+        """Re-open the LISTEN connection with backoff, then signal a possibly missed change."""
+        delay = 1
+        while not self._closing:
+            await asyncio.sleep(delay)
+            try:
+                await self._open_listen_conn()
+            except Exception as e:
+                logger.warning(f"LISTEN reconnect failed: {e}")
+                delay = min(delay * 2, max_delay)
+                continue
+            logger.info("LISTEN connection restored.")
+            # Notifications sent while disconnected are lost; treat the gap as a change
+            for channel, callback in self._listeners.items():
+                callback(self._listen_conn, 0, channel, None)
+            return
+
     async def close(self):
         """Close connection pool"""
+        self._closing = True
+        if self._relisten_task:
+            self._relisten_task.cancel()
+        if self._listen_conn is not None and not self._listen_conn.is_closed():
+            await self._listen_conn.close()
         if self.pool:
             await self.pool.close()
             logger.info("Database connection pool closed.")
+        if self._http:
+            await self._http.aclose()
+            self._http = None
+
+    def _circuit_open(self):
+        """True while the breaker is open and queries should fail fast."""
+        return time.monotonic() < self._open_until
+
+    def _record_failure(self, e):
+        """Count connection-level failures; open the breaker past the threshold."""
+        if not isinstance(e, CONNECTION_ERRORS):
+            return
+        self._failures += 1
+        if self._failures >= BREAKER_THRESHOLD:
+            self._open_until = time.monotonic() + BREAKER_COOLDOWN_SECONDS
+            logger.warning(f"Database unreachable ({self._failures} failures); failing fast for {BREAKER_COOLDOWN_SECONDS}s")
+
+    def _http_client(self):
+        """Lazily create the shared HTTP client (reuses TLS connections across calls)"""
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=10.0)
+        return self._http
 
     async def fetch_one(self, query, params=None):
         """Fetch single row"""
+        if self._circuit_open():
+            self._query_errors += 1
+            return None
         if not self.pool: 
             await self.connect()
         try:
@@ -55,8 +250,11 @@ class Database:
                     row = await connection.fetchrow(query, *params)
                 else:
                     row = await connection.fetchrow(query)
-                return row
+            self._failures = 0
+            return row
         except Exception as e:
+            self._query_errors += 1
+            self._record_failure(e)
             logger.error(f"DB Error (fetch_one): {e}")
             logger.error(f"Query: {query}")
             logger.error(f"Params: {params}")
@@ -64,6 +262,9 @@ class Database:
 
     async def fetch_all(self, query, params=None):
         """Fetch all rows"""
+        if self._circuit_open():
+            self._query_errors += 1
+            return []
         if not self.pool: 
             await self.connect()
         try:
@@ -72,8 +273,11 @@ class Database:
                     rows = await connection.fetch(query, *params)
                 else:
                     rows = await connection.fetch(query)
-                return rows
+            self._failures = 0
+            return rows
         except Exception as e:
+            self._query_errors += 1
+            self._record_failure(e)
             logger.error(f"DB Error (fetch_all): {e}")
             logger.error(f"Query: {query}")
             logger.error(f"Params: {params}")
@@ -81,6 +285,9 @@ class Database:
 
     async def execute(self, query, params=None):
         """Execute a query (INSERT/UPDATE/DELETE)"""
+        if self._circuit_open():
+            self._query_errors += 1
+            return None
         if not self.pool: 
             await self.connect()
         try:
@@ -89,17 +296,41 @@ class Database:
                     result = await connection.execute(query, *params)
                 else:
                     result = await connection.execute(query)
-                return result
+            self._failures = 0
+            return result
         except Exception as e:
+            self._query_errors += 1
+            self._record_failure(e)
             logger.error(f"DB Error (execute): {e}")
             logger.error(f"Query: {query}")
             logger.error(f"Params: {params}")
             return None
 
+    async def execute_many(self, query, rows):
+        """Execute a query for each parameter row in one batch"""
+        if not rows:
+            return
+        if self._circuit_open():
+            self._query_errors += 1
+            return
+        if not self.pool: 
+            await self.connect()
+        try:
+            async with self.pool.acquire() as connection:
+                await connection.executemany(query, rows)
+            self._failures = 0
+        except Exception as e:
+            self._query_errors += 1
+            self._record_failure(e)
+            logger.error(f"DB Error (execute_many): {e}")
+            logger.error(f"Query: {query}")
+            logger.error(f"Rows: {len(rows)}")
+
     # =========================================
     # ORDER MANAGEMENT
     # =========================================
 
+    @ttl_cache(seconds=60, maxsize=1024)
     async def get_order_by_id(self, order_id):
         """Get order by numeric ID"""
         query = """
@@ -116,12 +347,9 @@ class Database:
                 delivery_status,
                 payment_status,
                 payment_method,
-                customer_email,
                 coupon_code,
                 discount_amount,
                 tracking_token,
-                trx_id,
-                sender_number,
                 delivery_date,
                 created_at
             FROM orders 
@@ -129,6 +357,7 @@ class Database:
         """
         return await self.fetch_one(query, [order_id])
 
+    @ttl_cache(seconds=60, maxsize=1024)
     async def get_order_by_order_id(self, order_id_string):
         """Get order by order_id string (e.g., '#NG-63497')"""
         query = """
@@ -145,12 +374,9 @@ class Database:
                 delivery_status,
                 payment_status,
                 payment_method,
-                customer_email,
                 coupon_code,
                 discount_amount,
                 tracking_token,
-                trx_id,
-                sender_number,
                 delivery_date,
                 created_at
             FROM orders 
@@ -158,6 +384,7 @@ class Database:
         """
         return await self.fetch_one(query, [order_id_string])
 
+    @ttl_cache(seconds=60, maxsize=1024)
     async def get_order_by_phone(self, phone):
         """Get most recent order for a phone number"""
         query = """
@@ -174,7 +401,6 @@ class Database:
                 delivery_status,
                 payment_status,
                 payment_method,
-                customer_email,
                 coupon_code,
                 discount_amount,
                 tracking_token,
@@ -212,6 +438,7 @@ class Database:
         pattern = f"%{search_term}%"
         return await self.fetch_all(query, [pattern])
 
+    @ttl_cache(seconds=30)
     async def get_orders_by_status(self, status, limit=50):
         """Get orders filtered by status"""
         query = """
@@ -252,6 +479,7 @@ class Database:
         """
         return await self.fetch_all(query, [start_date, end_date, limit])
 
+    @ttl_cache(seconds=30)
     async def get_recent_orders(self, limit=15):
         """Get recent orders with essential fields"""
         query = """
@@ -272,8 +500,12 @@ class Database:
         """
         return await self.fetch_all(query, [limit])
 
-    async def get_all_orders(self):
-        """Fetch all orders for CSV export"""
+    async def iter_order_batches(self, batch_size=500):
+        """
+        Yield all orders (newest first) in batches for streaming CSV export.
+        Reads one snapshot through a server-side cursor; errors propagate so a
+        failed export is never mistaken for a complete one.
+        """
         query = """
             SELECT 
                 id,
@@ -291,9 +523,20 @@ class Database:
                 discount_amount,
                 created_at
             FROM orders 
-            ORDER BY created_at DESC
+            ORDER BY created_at DESC, id DESC
         """
-        return await self.fetch_all(query)
+        if not self.pool:
+            await self.connect()
+        async with self.pool.acquire() as connection:
+            async with connection.transaction(readonly=True):
+                cursor = await connection.cursor(query)
+                while True:
+                    rows = await cursor.fetch(batch_size)
+                    if not rows:
+                        return
+                    yield rows
+                    if len(rows) < batch_size:
+                        return
 
     async def get_latest_order_id(self):
         """Get the ID of the most recent order"""
@@ -309,10 +552,12 @@ class Database:
                 SET status = $1, delivery_status = $2 
                 WHERE id = $3
             """
-            return await self.execute(query, [status, delivery_status, order_id])
+            result = await self.execute(query, [status, delivery_status, order_id])
         else:
             query = "UPDATE orders SET status = $1 WHERE id = $2"
-            return await self.execute(query, [status, order_id])
+            result = await self.execute(query, [status, order_id])
+        self.invalidate_cache()
+        return result
 
     async def add_tracking_info(self, order_id, tracking_token, courier_name=None):
         """Add tracking information to order"""
@@ -321,14 +566,17 @@ class Database:
             SET tracking_token = $1
             WHERE id = $2
         """
-        return await self.execute(query, [tracking_token, order_id])
+        result = await self.execute(query, [tracking_token, order_id])
+        self.invalidate_cache()
+        return result
 
     # =========================================
     # PRODUCT MANAGEMENT
     # =========================================
 
-    async def get_all_products(self, active_only=True):
-        """Get all products"""
+    @ttl_cache(seconds=300)
+    async def get_all_products(self, active_only=True, limit=None):
+        """Get all products (first `limit` by name if given; total_count = rows before LIMIT)"""
         if active_only:
             query = """
                 SELECT 
@@ -340,7 +588,8 @@ class Database:
                     category_name,
                     is_featured,
                     image,
-                    images
+                    images,
+                    COUNT(*) OVER() as total_count
                 FROM products
                 WHERE is_active = TRUE
                 ORDER BY name
@@ -357,10 +606,13 @@ class Database:
                     is_featured,
                     is_active,
                     image,
-                    images
+                    images,
+                    COUNT(*) OVER() as total_count
                 FROM products
                 ORDER BY name
             """
+        if limit:
+            return await self.fetch_all(query + " LIMIT $1", [limit])
         return await self.fetch_all(query)
 
     async def search_products(self, search_term):
@@ -409,6 +661,7 @@ class Database:
         """
         return await self.fetch_one(query, [product_id])
 
+    @ttl_cache(seconds=60)
     async def get_low_stock_products(self, threshold=10):
         """Get products with low stock"""
         query = """
@@ -444,63 +697,53 @@ class Database:
         return await self.fetch_all(query, [limit])
 
     async def get_products_for_context(self):
-        """Get product info formatted for AI context"""
-        products = await self.get_all_products()
-        if not products:
+        """Get product info formatted for AI context (lines are built server-side)"""
+        query = """
+            SELECT string_agg(
+                format('- %s: ৳%s %s - %s',
+                    name,
+                    to_char(COALESCE(price, 0), 'FM999,999,999,990.00'),
+                    CASE WHEN stock_quantity > 0
+                        THEN '(' || stock_quantity || ' in stock)'
+                        ELSE '(Out of stock)' END,
+                    COALESCE(category_name, 'General')),
+                E'\\n' ORDER BY name
+            ) as lines
+            FROM products
+            WHERE is_active = TRUE
+        """
+        row = await self.fetch_one(query)
+        if not row or not row['lines']:
             return "No products available"
-        
-        lines = ["AVAILABLE PRODUCTS:"]
-        for p in products:
-            price = p.get('price', 0) or 0
-            stock = p.get('stock_quantity', 0)
-            category = p.get('category_name', 'General')
-            stock_status = f"({stock} in stock)" if stock > 0 else "(Out of stock)"
-            lines.append(f"- {p['name']}: ৳{price:,.2f} {stock_status} - {category}")
-        return "\n".join(lines)
+        return "AVAILABLE PRODUCTS:\n" + row['lines']
 
     # =========================================
     # COUPON MANAGEMENT
     # =========================================
 
+    @ttl_cache(seconds=300)
     async def get_all_coupons(self, active_only=True):
-        """Get all coupons"""
-        if active_only:
-            query = """
-                SELECT 
-                    id,
-                    code,
-                    discount_type,
-                    discount_value,
-                    min_order_value as min_order_amount,
-                    max_discount_amount as max_discount,
-                    usage_limit,
-                    usage_count as used_count,
-                    created_at as valid_from,
-                    expires_at as valid_until,
-                    is_active
-                FROM coupons
-                WHERE is_active = TRUE
-                ORDER BY created_at DESC
-            """
-            return await self.fetch_all(query)
-        else:
-            query = """
-                SELECT 
-                    id,
-                    code,
-                    discount_type,
-                    discount_value,
-                    min_order_value as min_order_amount,
-                    max_discount_amount as max_discount,
-                    usage_limit,
-                    usage_count as used_count,
-                    created_at as valid_from,
-                    expires_at as valid_until,
-                    is_active
-                FROM coupons
-                ORDER BY created_at DESC
-            """
-            return await self.fetch_all(query)
+        """Get all coupons (valid_until_str is pre-formatted for display)"""
+        where = "WHERE is_active = TRUE" if active_only else ""
+        query = f"""
+            SELECT 
+                id,
+                code,
+                discount_type,
+                discount_value,
+                min_order_value as min_order_amount,
+                max_discount_amount as max_discount,
+                usage_limit,
+                usage_count as used_count,
+                created_at as valid_from,
+                expires_at as valid_until,
+                TO_CHAR(expires_at, 'YYYY-MM-DD') as valid_until_str,
+                is_active
+            FROM coupons
+            {where}
+            ORDER BY created_at DESC
+        """
+        return await self.fetch_all(query)
 
     async def get_coupon_by_code(self, code):
         """Get coupon details by code"""
@@ -622,6 +865,26 @@ class Database:
             'avg_order_value': 0
         }
 
+    @ttl_cache(seconds=15)
+    async def get_period_stats(self):
+        """Get today / weekly / monthly sales statistics in one query"""
+        row = await self.fetch_one(PERIOD_SALES_QUERY)
+        return _split_period_stats(row)
+
+    @ttl_cache(seconds=15)
+    async def get_dashboard_bundle(self, low_stock_threshold=10):
+        """Get everything the admin dashboard shows in one statement (one round trip, one snapshot)"""
+        row = await self.fetch_one(DASHBOARD_BUNDLE_QUERY, [low_stock_threshold])
+        bundle = _split_period_stats(row)
+        bundle['users'] = {
+            'total_users': row['total_users'] if row else 0,
+            'active_users': row['active_users'] if row else 0
+        }
+        bundle['pending'] = row['pending_count'] if row else 0
+        bundle['low_stock_count'] = row['low_stock_count'] if row else 0
+        return bundle
+
+    @ttl_cache(seconds=300)
     async def get_top_products(self, days=30, limit=5):
         """Get top selling products by revenue"""
         query = """
@@ -640,6 +903,7 @@ class Database:
         """
         return await self.fetch_all(query, [days, limit])
 
+    @ttl_cache(seconds=300)
     async def get_daily_sales_stats(self, days=7):
         """Get daily sales totals for charts"""
         query = """
@@ -655,6 +919,7 @@ class Database:
         """
         return await self.fetch_all(query, [days])
 
+    @ttl_cache(seconds=300)
     async def get_status_breakdown(self):
         """Get order count by status"""
         query = """
@@ -669,6 +934,7 @@ class Database:
         """
         return await self.fetch_all(query)
 
+    @ttl_cache(seconds=300)
     async def get_payment_method_stats(self):
         """Get payment method statistics"""
         query = """
@@ -684,6 +950,7 @@ class Database:
         """
         return await self.fetch_all(query)
 
+    @ttl_cache(seconds=300)
     async def get_delivery_status_breakdown(self):
         """Get delivery status breakdown"""
         query = """
@@ -714,6 +981,21 @@ class Database:
         """
         return await self.execute(query, [user_id, username, first_name])
 
+    async def save_users(self, rows):
+        """Save or update many (user_id, username, first_name) rows at once"""
+        query = """
+            INSERT INTO users (user_id, username, first_name, last_seen)
+            VALUES ($1, $2, $3, CURRENT_TIMESTAMP)
+            ON CONFLICT (user_id) 
+            DO UPDATE SET 
+                username = $2, 
+                first_name = $3, 
+                last_seen = CURRENT_TIMESTAMP
+        """
+        await self.execute_many(query, rows)
+        self.invalidate_cache('get_user_stats')  # New users must show up in the counts right away
+
+    @ttl_cache(seconds=60)
     async def get_user_stats(self):
         """Get total and active user counts"""
         query = """
@@ -749,16 +1031,17 @@ class Database:
 
     async def seed_super_admins(self, admin_ids):
         """Insert env-var admin IDs as super admins (idempotent)."""
-        for uid in admin_ids:
-            query = """
-                INSERT INTO admins (user_id, is_super_admin)
-                VALUES ($1, TRUE)
-                ON CONFLICT (user_id)
-                DO UPDATE SET is_super_admin = TRUE
-            """
-            await self.execute(query, [uid])
+        query = """
+            INSERT INTO admins (user_id, is_super_admin)
+            VALUES ($1, TRUE)
+            ON CONFLICT (user_id)
+            DO UPDATE SET is_super_admin = TRUE
+        """
+        await self.execute_many(query, [(uid,) for uid in admin_ids])
+        self.invalidate_cache()
         logger.info(f"Seeded {len(admin_ids)} super admin(s)")
 
+    @ttl_cache(seconds=300)
     async def get_all_admins(self):
         """Get all admins with their info."""
         query = """
@@ -787,6 +1070,7 @@ class Database:
             VALUES ($1, $2, $3, $4)
         """
         result = await self.execute(query, [user_id, username, first_name, added_by])
+        self.invalidate_cache()
         return result is not None
 
     async def remove_admin(self, user_id):
@@ -800,6 +1084,7 @@ class Database:
             return False
         query = "DELETE FROM admins WHERE user_id = $1"
         await self.execute(query, [user_id])
+        self.invalidate_cache()
         return True
 
     async def is_admin(self, user_id):
@@ -823,29 +1108,63 @@ class Database:
         rows = await self.fetch_all("SELECT user_id FROM users")
         return [r['user_id'] for r in rows]
 
-    async def get_data_dump(self):
-        """Dump all critical tables for backup."""
-        data = {}
+    async def iter_user_id_batches(self, batch_size=1000):
+        """
+        Yield user IDs in batches (keyset paging, no full list in memory).
+        Errors propagate so callers can tell a failed read from the end of the list.
+        """
+        if not self.pool:
+            await self.connect()
+        last_id = None
+        while True:
+            # Short per-batch checkouts: a long broadcast must not pin a pooled connection
+            async with self.pool.acquire() as connection:
+                if last_id is None:
+                    rows = await connection.fetch(
+                        "SELECT user_id FROM users ORDER BY user_id LIMIT $1", batch_size
+                    )
+                else:
+                    rows = await connection.fetch(
+                        "SELECT user_id FROM users WHERE user_id > $1 ORDER BY user_id LIMIT $2",
+                        last_id, batch_size
+                    )
+            if not rows:
+                return
+            batch = [r['user_id'] for r in rows]
+            yield batch
+            if len(batch) < batch_size:
+                return
+            last_id = batch[-1]
+
+    async def iter_data_dump(self, batch_size=500):
+        """
+        Yield a backup of all critical tables as JSON text chunks: {"table": [rows], ...}.
+        PostgreSQL serializes each row; rows stream from one snapshot and are never parsed here.
+        Errors propagate so a failed backup is not sent as a complete one.
+        """
         tables = ['users', 'orders', 'products', 'coupons', 'admins']
-        
-        for table in tables:
-            rows = await self.fetch_all(f"SELECT * FROM {table}")
-            # Convert record objects to dicts and handle datetime serialization
-            table_data = []
-            for row in rows:
-                row_dict = dict(row)
-                for k, v in row_dict.items():
-                    if isinstance(v, (datetime, timedelta)):
-                        row_dict[k] = str(v)
-                table_data.append(row_dict)
-            data[table] = table_data
-            
-        return data
+        if not self.pool:
+            await self.connect()
+        async with self.pool.acquire() as connection:
+            async with connection.transaction(readonly=True):
+                for i, table in enumerate(tables):
+                    yield ('{' if i == 0 else ',\n') + f'"{table}": ['
+                    sep = '\n'
+                    cursor = await connection.cursor(f"SELECT row_to_json(t)::text FROM {table} t")
+                    while True:
+                        rows = await cursor.fetch(batch_size)
+                        if not rows:
+                            break
+                        yield sep + ',\n'.join(row[0] for row in rows)
+                        sep = ',\n'
+                    yield '\n]'
+                yield '}\n'
 
     # =========================================
     # ADMIN UTILITIES
     # =========================================
 
+    @ttl_cache(seconds=60)
     async def get_inventory_alerts(self):
         """Get low stock and out of stock products"""
         query = """
@@ -872,6 +1191,7 @@ class Database:
         result = await self.fetch_one(query)
         return result['count'] if result else 0
 
+    @ttl_cache(seconds=300)
     async def get_revenue_by_category(self, days=30):
         """Get revenue breakdown by product category"""
         query = """
@@ -880,7 +1200,14 @@ class Database:
                 COUNT(o.id) as order_count,
                 COALESCE(SUM(o.total_price), 0) as revenue
             FROM orders o
-            JOIN products p ON o.product_name ILIKE '%' || p.name || '%'
+            -- One product per order (longest matching name), so no order is counted twice
+            CROSS JOIN LATERAL (
+                SELECT category_name
+                FROM products
+                WHERE o.product_name ILIKE '%' || name || '%'
+                ORDER BY length(name) DESC
+                LIMIT 1
+            ) p
             WHERE o.created_at >= CURRENT_DATE - $1 * INTERVAL '1 day'
             AND o.status != 'Cancelled'
             GROUP BY p.category_name
@@ -889,7 +1216,6 @@ class Database:
         return await self.fetch_all(query, [days])
     async def get_website_analytics(self) -> Optional[Dict]:
         """Fetches live website data from the Vercel API endpoint."""
-        import os
         api_url = f"{os.getenv('WEBSITE_URL')}/api/analytics"
         api_key = os.getenv('ANALYTICS_API_KEY')
         
@@ -898,30 +1224,33 @@ class Database:
             return None
 
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                headers = {'x-api-key': api_key}
-                response = await client.get(api_url, headers=headers)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    logger.info(f"Analytics fetched: {data.get('today', {}).get('visitors')} visitors today")
-                    return data
-                else:
-                    logger.error(f"Analytics API returned {response.status_code}: {response.text}")
-                    return None
+            headers = {'x-api-key': api_key}
+            response = await self._http_client().get(api_url, headers=headers)
+            
+            if response.status_code == 200:
+                data = response.json()
+                logger.info(f"Analytics fetched: {data.get('today', {}).get('visitors')} visitors today")
+                return data
+            else:
+                logger.error(f"Analytics API returned {response.status_code}: {response.text}")
+                return None
         except Exception as e:
             logger.error(f"Failed to fetch website analytics: {e}")
             return None
 
     async def get_conversion_metrics(self) -> Dict:
         """Combines website traffic with database sales for conversion analysis."""
-        # Get sales from DB (Last 24h)
-        today_stats = await self.get_today_stats()
+        # Sales from DB (today) and traffic from GA4, fetched concurrently
+        periods, website = await asyncio.gather(
+            self.get_period_stats(),
+            self.get_website_analytics()
+        )
+        return self._build_conversion_metrics(periods['today'], website)
+
+    def _build_conversion_metrics(self, today_stats, website) -> Dict:
+        """Merge today's DB sales with website analytics (None = database only)."""
         orders_today = today_stats.get('order_count', 0)
         
-        # Get traffic from GA4
-        website = await self.get_website_analytics()
-        
         if not website:
             return {
                 'mode': 'database_only',
@@ -946,21 +1275,24 @@ class Database:
 
     async def get_business_intelligence(self) -> Dict:
         """MASTER METHOD: Combines ALL data sources for comprehensive business analysis."""
-        import asyncio
-        
+        # All sales periods come from one query; conversion reuses today's row
         results = await asyncio.gather(
-            self.get_today_stats(),
-            self.get_weekly_stats(),
-            self.get_monthly_stats(),
+            self.get_period_stats(),
             self.get_top_products(days=30, limit=5),
             self.get_inventory_alerts(),
             self.get_revenue_by_category(days=30),
-            self.get_conversion_metrics(),
+            self.get_website_analytics(),
             return_exceptions=True
         )
         
         # Unpack results
-        today, weekly, monthly, top_products, low_stock, categories, conversion = results
+        periods, top_products, low_stock, categories, website = results
+        today, weekly, monthly = periods['today'], periods['weekly'], periods['monthly']
+        
+        if isinstance(website, Exception):
+            conversion = website
+        else:
+            conversion = self._build_conversion_metrics(today, website)
         
         # Handle exceptions
         if isinstance(conversion, Exception):
@@ -3,37 +3,71 @@ import logging
 import os
 import sys
 import asyncio
-from datetime import datetime
+import atexit
+import functools
+import queue
+import re
+import time
+import weakref
+from string import Template
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 # Configure logging
+# Handlers run on a background QueueListener thread so that log I/O
+# (console + optional LOG_FILE) never blocks the event loop.
+_log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_log_handlers = [logging.StreamHandler()]
+if os.getenv("LOG_FILE"):
+    _log_handlers.append(logging.FileHandler(os.getenv("LOG_FILE"), encoding='utf-8'))
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+
+_log_queue = queue.SimpleQueue()
 logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    handlers=[QueueHandler(_log_queue)]
 )
+log_listener = QueueListener(_log_queue, *_log_handlers, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
 # Import Database (Enhanced Version)
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from database import Database
+from session_store import SessionStore
 
 # 3rd Party Imports
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove, InputMediaPhoto, InputMediaVideo
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, 
-    CallbackQueryHandler, filters, ContextTypes
+    CallbackQueryHandler, filters, ContextTypes, BaseUpdateProcessor
 )
-from telegram.constants import ParseMode
-from telegram.error import BadRequest
+from telegram.constants import ParseMode, ChatAction
+from telegram.request import HTTPXRequest
+from telegram.helpers import escape_markdown
+from telegram.error import BadRequest, RetryAfter
 import csv
 import io
+import json
+import zipfile
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 
+# Optional: libuv-based event loop (not available on Windows)
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
 # Optional: AI
 try:
     import google.generativeai as genai
@@ -51,16 +85,21 @@ ENV_ADMIN_IDS = [
     int(i.strip()) for i in os.getenv("ADMIN_USER_IDS", "").split(",") 
     if i.strip().isdigit()
 ]
-# Live admin list — loaded from DB on startup, refreshed on add/remove
-ADMIN_USER_IDS = set(ENV_ADMIN_IDS)
+ENV_ADMIN_SET = frozenset(ENV_ADMIN_IDS)
+# Live admin list — loaded from DB on startup, refreshed on add/remove.
+# Immutable: refresh rebinds it, so loops over it never see a half-updated set.
+ADMIN_USER_IDS = ENV_ADMIN_SET
 
 async def refresh_admin_list():
-    """Reload admin list from database."""
+    """Reload admin list from database and resync roles of cached sessions."""
     global ADMIN_USER_IDS
     try:
         db_admins = await db.get_admin_ids()
-        ADMIN_USER_IDS = set(db_admins) | set(ENV_ADMIN_IDS)
-        logger.info(f"Admin list refreshed: {ADMIN_USER_IDS}")
+        ADMIN_USER_IDS = frozenset(db_admins) | ENV_ADMIN_SET
+        for sessions in (user_sessions, _evicted_sessions):
+            for uid, session in sessions.items():
+                session.role = "admin" if uid in ADMIN_USER_IDS else "user"
+        logger.info(f"Admin list refreshed: {set(ADMIN_USER_IDS)}")
     except Exception as e:
         logger.error(f"Failed to refresh admin list: {e}")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -75,8 +114,13 @@ if not TELEGRAM_BOT_TOKEN:
     logger.error("TELEGRAM_BOT_TOKEN is missing in .env!")
     sys.exit(1)
 
-# Initialize Database
-db = Database(DATABASE_URL)
+# Initialize Database (pool sized for the concurrent dashboard/broadcast queries)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Webhook mode (Telegram pushes updates); polling is used when unset
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+PORT = int(os.getenv("PORT", "8443"))
+db = Database(DATABASE_URL, min_pool_size=DB_POOL_MIN_SIZE, max_pool_size=DB_POOL_MAX_SIZE)
 
 # Initialize AI Models (Multi-Model Strategy)
 ai_initialized = False
@@ -179,15 +223,105 @@ class UserSession:
             return True
         return (now - self.last_ai_request).total_seconds() >= cooldown_seconds
 
-user_sessions = {}
+    def to_row(self):
+        """Snapshot for SessionStore.save_many()."""
+        return (
+            self.user_id, self.username, self.first_name, self.state,
+            json.dumps(self.temp_data, default=str), self.last_activity.isoformat()
+        )
+
+# In-memory LRU of live sessions; cold ones are evicted and reloaded from the store
+SESSION_CACHE_MAX = 10_000
+user_sessions = OrderedDict()
+
+# Persistent session snapshots (SQLite WAL); dirty sessions are flushed in batches
+SESSION_DB_FILE = os.getenv("SESSION_DB_FILE", "sessions.db")
+SESSION_FLUSH_SECONDS = 5
+try:
+    session_store = SessionStore(SESSION_DB_FILE)
+except Exception as e:
+    logger.error(f"Session store unavailable, sessions will not persist: {e}")
+    session_store = None
+# States only admins may be in; never restored or dispatched for anyone else
+ADMIN_STATES = frozenset({"waiting_admin_id", "waiting_broadcast_msg", "waiting_search"})
+_dirty_sessions = set()
+_evicted_sessions = {}  # Dirty sessions evicted before their flush; revived on next access
+_flush_needed = asyncio.Event()  # Set when there is something for session_flush_loop to write
 
 def get_session(user_id, username=None, first_name=None):
-    if user_id not in user_sessions:
-        user_sessions[user_id] = UserSession(user_id, username, first_name)
-    session = user_sessions[user_id]
+    session = user_sessions.get(user_id)
+    if session is None:
+        session = _evicted_sessions.pop(user_id, None)
+        stored = None
+        if session is None:
+            session = UserSession(user_id, username, first_name)
+            stored = session_store.load(user_id) if session_store else None
+        if stored:
+            session.username = username or stored['username']
+            session.first_name = first_name or stored['first_name']
+            session.state = stored['state'] or "menu"
+            if session.state in ADMIN_STATES and user_id not in ADMIN_USER_IDS:
+                session.state = "menu"  # Demoted since the snapshot was taken
+            session.temp_data = stored['temp_data']
+        user_sessions[user_id] = session
+        if len(user_sessions) > SESSION_CACHE_MAX:
+            _evict_oldest_session()
+    else:
+        user_sessions.move_to_end(user_id)
     session.last_activity = datetime.now()
+    if session_store:  # Without a store nothing ever drains the dirty set
+        _dirty_sessions.add(user_id)
+        _flush_needed.set()
     return session
 
+def _evict_oldest_session():
+    """Drop the least recently used session, keeping its snapshot if unsaved."""
+    uid, session = user_sessions.popitem(last=False)
+    if uid in _dirty_sessions:
+        _dirty_sessions.discard(uid)
+        _evicted_sessions[uid] = session
+
+def _take_dirty_rows():
+    """Snapshot and clear the dirty-session set."""
+    rows = [s.to_row() for s in _evicted_sessions.values()]
+    rows += [user_sessions[uid].to_row() for uid in _dirty_sessions if uid in user_sessions]
+    _dirty_sessions.clear()
+    _evicted_sessions.clear()
+    return rows
+
+def flush_sessions():
+    """Write all dirty sessions to the session store in one transaction."""
+    if session_store and (_dirty_sessions or _evicted_sessions):
+        session_store.save_many(_take_dirty_rows())
+
+_pending_users = {}  # user_id -> (user_id, username, first_name)
+
+def queue_user_save(user):
+    """Queue a users-table upsert; written in bulk by session_flush_loop."""
+    _pending_users[user.id] = (user.id, user.username, user.first_name)
+    _flush_needed.set()
+
+async def flush_users():
+    """Upsert all queued users in one executemany."""
+    if not _pending_users:
+        return
+    rows = list(_pending_users.values())
+    _pending_users.clear()
+    await db.save_users(rows)
+
+async def session_flush_loop():
+    """Background task: batch session and user writes every few seconds."""
+    while True:
+        # Sleep until something changes instead of waking on a fixed timer
+        await _flush_needed.wait()
+        await asyncio.sleep(SESSION_FLUSH_SECONDS)  # Coalesce writes for a few seconds
+        _flush_needed.clear()
+        if session_store and (_dirty_sessions or _evicted_sessions):
+            await asyncio.to_thread(session_store.save_many, _take_dirty_rows())
+        await flush_users()
+
+atexit.register(flush_sessions)
+
 # Load Knowledge Base
 try:
     with open('bot_standard/knowledge_base.md', 'r', encoding='utf-8') as f:
@@ -242,6 +376,8 @@ GUIDELINES:
 # KEYBOARDS
 # ===============================================
 
+# ai_initialized is settled at import, so both menus are constant after first use
+@functools.lru_cache(maxsize=1)
 def get_admin_menu():
     rows = [
         [InlineKeyboardButton("📊 Dashboard", callback_data="admin_dashboard"),
@@ -261,6 +397,7 @@ def get_admin_menu():
     rows.append([InlineKeyboardButton("◀️ Refresh", callback_data="back_menu")])
     return InlineKeyboardMarkup(rows)
 
+@functools.lru_cache(maxsize=1)
 def get_user_menu():
     buttons = [
         [InlineKeyboardButton("📦 Track Order", callback_data="user_track_order"),
@@ -276,9 +413,12 @@ def get_user_menu():
     
     return InlineKeyboardMarkup(buttons)
 
+# Markups are immutable in python-telegram-bot, so constant ones are built once
+@functools.lru_cache(maxsize=None)
 def get_back_button(callback_data="back_menu"):
     return InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back to Menu", callback_data=callback_data)]])
 
+@functools.lru_cache(maxsize=1)
 def get_order_filter_menu():
     return InlineKeyboardMarkup([
         [InlineKeyboardButton("📋 All Orders", callback_data="filter_all"),
@@ -288,6 +428,47 @@ def get_order_filter_menu():
         [InlineKeyboardButton("◀️ Back", callback_data="admin_orders")]
     ])
 
+@functools.lru_cache(maxsize=1)
+def get_orders_keyboard():
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("🔍 Search Order", callback_data="admin_search"),
+         InlineKeyboardButton("🔄 Filter", callback_data="admin_filter")],
+        [InlineKeyboardButton("◀️ Back", callback_data="back_menu")]
+    ])
+
+@functools.lru_cache(maxsize=1)
+def get_back_to_orders_button():
+    return InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data="admin_orders")]])
+
+@functools.lru_cache(maxsize=1)
+def get_back_to_admins_button():
+    return InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data="admin_admins")]])
+
+@functools.lru_cache(maxsize=1)
+def get_add_admin_cancel_keyboard():
+    return InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancel", callback_data="admin_admins")]])
+
+@functools.lru_cache(maxsize=1)
+def get_add_admin_retry_keyboard():
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("🔄 Try Again", callback_data="admin_add_admin"),
+        InlineKeyboardButton("◀️ Back", callback_data="admin_admins")
+    ]])
+
+@functools.lru_cache(maxsize=1)
+def get_admin_added_keyboard():
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("👥 Admin List", callback_data="admin_admins"),
+        InlineKeyboardButton("◀️ Menu", callback_data="back_menu")
+    ]])
+
+@functools.lru_cache(maxsize=1)
+def get_broadcast_confirm_keyboard():
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("✅ Send Broadcast", callback_data='admin_broadcast_confirm'),
+        InlineKeyboardButton("❌ Cancel", callback_data='admin_broadcast_cancel')
+    ]])
+
 # ===============================================
 # COMMAND HANDLERS
 # ===============================================
@@ -298,7 +479,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     session = get_session(user.id, user.username, user.first_name)
     session.state = "menu"
     
-    await db.save_user(user.id, user.username, user.first_name)
+    queue_user_save(user)
     
     if session.role == "admin":
         text = (
@@ -350,7 +531,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if update.message:
                 await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
             elif update.callback_query:
-                await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+                await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
                 
     except BadRequest as e:
         logger.error(f"Error in start command: {e}")
@@ -397,49 +578,75 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ADMIN HANDLERS
 # ===============================================
 
-async def admin_dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.effective_user.id not in ADMIN_USER_IDS: 
-        return
-    
-    try:
-        today = await db.get_today_stats()
-        weekly = await db.get_weekly_stats()
-        monthly = await db.get_monthly_stats()
-        users = await db.get_user_stats()
-        pending = await db.get_pending_orders_count()
-        low_stock = await db.get_low_stock_products(threshold=10)
-        
-        text = f"""📊 **BUSINESS DASHBOARD**
+# Parsed once at import; values are pre-formatted by admin_dashboard
+DASHBOARD_TEMPLATE = Template("""📊 **BUSINESS DASHBOARD**
 ━━━━━━━━━━━━━━━━━━━━━━
 
 📅 **TODAY:**
-📦 Orders: {today.get('order_count', 0)}
-💰 Revenue: ৳{today.get('total_revenue', 0):,.2f}
-📊 Avg Value: ৳{today.get('avg_order_value', 0):,.2f}
+📦 Orders: $today_orders
+💰 Revenue: ৳$today_revenue
+📊 Avg Value: ৳$today_avg
 
 📅 **THIS WEEK:**
-📦 Orders: {weekly.get('order_count', 0)}
-💰 Revenue: ৳{weekly.get('total_revenue', 0):,.2f}
-📊 Avg Value: ৳{weekly.get('avg_order_value', 0):,.2f}
+📦 Orders: $weekly_orders
+💰 Revenue: ৳$weekly_revenue
+📊 Avg Value: ৳$weekly_avg
 
 📅 **THIS MONTH:**
-📦 Orders: {monthly.get('order_count', 0)}
-💰 Revenue: ৳{monthly.get('total_revenue', 0):,.2f}
+📦 Orders: $monthly_orders
+💰 Revenue: ৳$monthly_revenue
 
 👥 **USERS:**
-Total: {users.get('total_users', 0)}
-Active (7d): {users.get('active_users', 0)}
+Total: $total_users
+Active (7d): $active_users
 
 ⚠️ **ALERTS:**
-⏳ Pending Orders: {pending}
-📦 Low Stock Items: {len(low_stock)}
-"""
+⏳ Pending Orders: $pending
+📦 Low Stock Items: $low_stock
+""")
+
+# Per-order row formats for the filter and search result lists
+FILTER_ORDER_ROW = (
+    "{emoji} **{order_id}** - ৳{total:,.0f}\n"
+    "👤 {customer}\n"
+    "─────────────────\n"
+)
+SEARCH_ORDER_ROW = (
+    "{emoji} **{order_id}**\n"
+    "👤 {customer} • 📱 {phone}\n"
+    "💰 ৳{total:,.0f} • {delivery}\n"
+    "─────────────────\n"
+)
+
+async def admin_dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_USER_IDS: 
+        return
+    
+    try:
+        bundle = await db.get_dashboard_bundle(low_stock_threshold=10)
+        today, weekly, monthly = bundle['today'], bundle['weekly'], bundle['monthly']
+        users, pending, low_stock_count = bundle['users'], bundle['pending'], bundle['low_stock_count']
+        
+        text = DASHBOARD_TEMPLATE.substitute(
+            today_orders=today.get('order_count', 0),
+            today_revenue=f"{today.get('total_revenue', 0):,.2f}",
+            today_avg=f"{today.get('avg_order_value', 0):,.2f}",
+            weekly_orders=weekly.get('order_count', 0),
+            weekly_revenue=f"{weekly.get('total_revenue', 0):,.2f}",
+            weekly_avg=f"{weekly.get('avg_order_value', 0):,.2f}",
+            monthly_orders=monthly.get('order_count', 0),
+            monthly_revenue=f"{monthly.get('total_revenue', 0):,.2f}",
+            total_users=users.get('total_users', 0),
+            active_users=users.get('active_users', 0),
+            pending=pending,
+            low_stock=low_stock_count
+        )
         # USE ADMIN AI FOR DASHBOARD TIP
         try:
             model = get_ai_model("admin")
-            ai_prompt = f"Analyze: {len(low_stock)} low stock, {pending} pending. Give 1 sentence of boss-level advice."
-            ai_response = model.generate_content(ai_prompt)
-            tip = ai_response.text.strip()
+            ai_prompt = f"Analyze: {low_stock_count} low stock, {pending} pending. Give 1 sentence of boss-level advice."
+            ai_response = await model.generate_content_async(ai_prompt)
+            tip = sanitize_markdown(ai_response.text.strip())
             text += f"\n💡 **AI Manager Tip**: {tip}\n"
         except Exception:
             pass
@@ -447,7 +654,7 @@ Active (7d): {users.get('active_users', 0)}
         reply_markup = get_back_button()
         
         if update.callback_query:
-            await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+            await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
         else:
             await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
             
@@ -455,7 +662,7 @@ Active (7d): {users.get('active_users', 0)}
         logger.error(f"Dashboard error: {e}")
         error_text = "❌ Error loading dashboard. Please try again."
         if update.callback_query:
-            await update.callback_query.edit_message_text(error_text)
+            await edit_if_changed(update.callback_query, error_text)
         else:
             await update.message.reply_text(error_text)
 
@@ -464,30 +671,28 @@ async def admin_analytics(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     try:
-        status_breakdown = await db.get_status_breakdown()
-        payment_stats = await db.get_payment_method_stats()
-        delivery_breakdown = await db.get_delivery_status_breakdown()
-        
-        text = "📊 **ADVANCED ANALYTICS** (Last 30 Days)\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
-        
-        # Order Status
-        text += "📋 **Order Status:**\n"
-        for stat in status_breakdown:
-            text += f"• {stat['status']}: {stat['count']} orders (৳{stat['revenue']:,.0f})\n"
-        
-        text += "\n💳 **Payment Methods:**\n"
-        for method in payment_stats:
-            text += f"• {method['payment_method']}: {method['count']} orders (৳{method['revenue']:,.0f})\n"
+        status_breakdown, payment_stats, delivery_breakdown = await asyncio.gather(
+            db.get_status_breakdown(),
+            db.get_payment_method_stats(),
+            db.get_delivery_status_breakdown()
+        )
         
-        for delivery in delivery_breakdown:
-            text += f"• {delivery['delivery_status']}: {delivery['count']} orders\n"
+        text = "".join([
+            "📊 **ADVANCED ANALYTICS** (Last 30 Days)\n━━━━━━━━━━━━━━━━━━━━━━\n\n",
+            # Order Status
+            "📋 **Order Status:**\n",
+            *(f"• {stat['status']}: {stat['count']} orders (৳{stat['revenue']:,.0f})\n" for stat in status_breakdown),
+            "\n💳 **Payment Methods:**\n",
+            *(f"• {method['payment_method']}: {method['count']} orders (৳{method['revenue']:,.0f})\n" for method in payment_stats),
+            *(f"• {delivery['delivery_status']}: {delivery['count']} orders\n" for delivery in delivery_breakdown),
+        ])
         
         # USE ADMIN AI FOR STRATEGIC ANALYSIS
         try:
             model = get_ai_model("admin")
             ai_prompt = f"Analyze these stats: Status: {status_breakdown}, Payments: {payment_stats}. Provide 1 strategic breakthrough idea (1 sentence)."
-            ai_response = model.generate_content(ai_prompt)
-            analysis = ai_response.text.strip()
+            ai_response = await model.generate_content_async(ai_prompt)
+            analysis = sanitize_markdown(ai_response.text.strip())
             text += f"\n📈 **AI Strategy**: {analysis}\n"
         except Exception:
             pass
@@ -495,7 +700,7 @@ async def admin_analytics(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup = get_back_button()
         
         if update.callback_query:
-            await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+            await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
         else:
             await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
             
@@ -513,26 +718,22 @@ async def admin_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not orders:
             text = "📦 **RECENT ORDERS**\n\nNo orders found."
         else:
-            text = "📦 **RECENT ORDERS**\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
-            for o in orders:
+            blocks = (
+                f"{get_status_emoji(o.get('status'))} **{o.get('order_id', 'N/A')}**\n"
+                f"👤 {o.get('customer_name', 'Unknown')}\n"
+                f"📱 {o.get('phone', 'N/A')}\n"
                 # Fixed: Use total_price instead of total
-                total = o.get('total_price', 0) or 0
-                status_emoji = get_status_emoji(o.get('status'))
-                text += f"{status_emoji} **{o.get('order_id', 'N/A')}**\n"
-                text += f"👤 {o.get('customer_name', 'Unknown')}\n"
-                text += f"📱 {o.get('phone', 'N/A')}\n"
-                text += f"💰 ৳{total:,.0f}\n"
-                text += f"📊 {o.get('delivery_status', o.get('status', 'N/A'))}\n"
-                text += "─────────────────\n"
-        
-        reply_markup = InlineKeyboardMarkup([
-            [InlineKeyboardButton("🔍 Search Order", callback_data="admin_search"),
-             InlineKeyboardButton("🔄 Filter", callback_data="admin_filter")],
-            [InlineKeyboardButton("◀️ Back", callback_data="back_menu")]
-        ])
+                f"💰 ৳{(o.get('total_price', 0) or 0):,.0f}\n"
+                f"📊 {o.get('delivery_status', o.get('status', 'N/A'))}\n"
+                "─────────────────\n"
+                for o in orders
+            )
+            text = render_blocks("📦 **RECENT ORDERS**\n━━━━━━━━━━━━━━━━━━━━━━\n\n", blocks)
+        
+        reply_markup = get_orders_keyboard()
         
         if update.callback_query:
-            await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+            await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
         else:
             await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
             
@@ -545,32 +746,38 @@ async def admin_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     try:
-        products = await db.get_all_products(active_only=True)
-        low_stock = await db.get_low_stock_products(threshold=10)
+        # Show all products (limit to 10 for now to avoid message limit)
+        products, low_stock = await asyncio.gather(
+            db.get_all_products(active_only=True, limit=10),
+            db.get_low_stock_products(threshold=10)
+        )
+        total_active = products[0]['total_count'] if products else 0
         
-        text = f"🛍️ **PRODUCT INVENTORY**\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
-        text += f"📊 Total Active: {len(products)}\n"
-        text += f"⚠️ Low Stock: {len(low_stock)}\n\n"
+        parts = [
+            "🛍️ **PRODUCT INVENTORY**\n━━━━━━━━━━━━━━━━━━━━━━\n\n",
+            f"📊 Total Active: {total_active}\n",
+            f"⚠️ Low Stock: {len(low_stock)}\n\n"
+        ]
         
         if low_stock:
-            text += "**⚠️ Low Stock Alert:**\n"
-            for p in low_stock[:5]:
-                text += f"• {p['name']}: {p['stock_quantity']} left\n"
-            text += "\n"
+            parts.append("**⚠️ Low Stock Alert:**\n")
+            parts.extend(f"• {p['name']}: {p['stock_quantity']} left\n" for p in low_stock[:5])
+            parts.append("\n")
         
-        text += "**All Products:**\n"
-        # Show all products (limit to 10 for now to avoid message limit)
-        display_products = products[:10]
-        for p in display_products:
+        parts.append("**All Products:**\n")
+        for p in products:
             stock_emoji = "✅" if p['stock_quantity'] > 10 else "⚠️"
             featured_star = "⭐" if p.get('is_featured') else ""
-            text += f"{stock_emoji} {p['name']} {featured_star}\n"
-            text += f"   ৳{p['price']:,.0f} • Stock: {p['stock_quantity']}\n"
+            parts.append(
+                f"{stock_emoji} {p['name']} {featured_star}\n"
+                f"   ৳{p['price']:,.0f} • Stock: {p['stock_quantity']}\n"
+            )
+        text = "".join(parts)
         
         reply_markup = get_back_button()
         
         if update.callback_query:
-            await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+            await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
         else:
             await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
             
@@ -578,6 +785,19 @@ async def admin_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Products error: {e}")
         await send_error_message(update, "loading products")
 
+def format_coupon_block(c):
+    """Render one coupon for the admin coupon list."""
+    status_emoji = "✅" if c.get('is_active', True) else "❌"
+    discount_text = f"{c['discount_value']}%" if c['discount_type'] == 'percentage' else f"৳{c['discount_value']}"
+    usage_text = f"{c['used_count']}/{c['usage_limit']}" if c['usage_limit'] else f"{c['used_count']} used"
+    lines = [f"{status_emoji} **{c['code']}**", f"💰 {discount_text} off", f"📊 {usage_text}"]
+    if c['min_order_amount']:
+        lines.append(f"📦 Min: ৳{c['min_order_amount']}")
+    if c['valid_until_str']:
+        lines.append(f"⏰ Until: {c['valid_until_str']}")
+    lines.append("─────────────────\n")
+    return "\n".join(lines)
+
 async def admin_coupons(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_USER_IDS: 
         return
@@ -589,25 +809,15 @@ async def admin_coupons(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not coupons:
             text = "🎟️ **COUPON MANAGEMENT**\n\nNo coupons found."
         else:
-            text = "🎟️ **COUPON MANAGEMENT**\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
-            for c in coupons:
-                status_emoji = "✅" if c.get('is_active', True) else "❌"
-                discount_text = f"{c['discount_value']}%" if c['discount_type'] == 'percentage' else f"৳{c['discount_value']}"
-                usage_text = f"{c['used_count']}/{c['usage_limit']}" if c['usage_limit'] else f"{c['used_count']} used"
-                
-                text += f"{status_emoji} **{c['code']}**\n"
-                text += f"💰 {discount_text} off\n"
-                text += f"📊 {usage_text}\n"
-                if c['min_order_amount']:
-                    text += f"📦 Min: ৳{c['min_order_amount']}\n"
-                if c['valid_until']:
-                    text += f"⏰ Until: {c['valid_until'].strftime('%Y-%m-%d')}\n"
-                text += "─────────────────\n"
+            text = render_blocks(
+                "🎟️ **COUPON MANAGEMENT**\n━━━━━━━━━━━━━━━━━━━━━━\n\n",
+                map(format_coupon_block, coupons)
+            )
         
         reply_markup = get_back_button()
         
         if update.callback_query:
-            await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+            await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
         else:
             await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
             
@@ -626,7 +836,7 @@ async def admin_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = get_back_button()
     
     if update.callback_query:
-        await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+        await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
     else:
         await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
 
@@ -638,7 +848,7 @@ async def admin_filter(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = "🔄 **FILTER ORDERS**\n\nChoose a status to filter:"
     
     if update.callback_query:
-        await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+        await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
     else:
         await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
 
@@ -668,20 +878,23 @@ async def handle_filter_callback(update: Update, context: ContextTypes.DEFAULT_T
         if not orders:
             text = f"📦 **{title}**\n\nNo orders found."
         else:
-            text = f"📦 **{title}**\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
-            for o in orders:
-                total = o.get('total_price', 0) or 0
-                status_emoji = get_status_emoji(o.get('status'))
-                text += f"{status_emoji} **{o.get('order_id', 'N/A')}** - ৳{total:,.0f}\n"
-                text += f"👤 {o.get('customer_name', 'Unknown')}\n"
-                text += "─────────────────\n"
+            blocks = (
+                FILTER_ORDER_ROW.format(
+                    emoji=get_status_emoji(o.get('status')),
+                    order_id=o.get('order_id', 'N/A'),
+                    total=o.get('total_price', 0) or 0,
+                    customer=o.get('customer_name', 'Unknown'),
+                )
+                for o in orders
+            )
+            text = render_blocks(f"📦 **{title}**\n━━━━━━━━━━━━━━━━━━━━━━\n\n", blocks)
         
-        reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data="admin_orders")]])
-        await query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+        reply_markup = get_back_to_orders_button()
+        await edit_if_changed(query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
         
     except Exception as e:
         logger.error(f"Filter error: {e}")
-        await query.edit_message_text("❌ Error filtering orders.")
+        await edit_if_changed(query, "❌ Error filtering orders.")
 
 async def admin_export(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMIN_USER_IDS: 
@@ -734,6 +947,19 @@ async def admin_chart(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ADMIN MANAGEMENT HANDLERS
 # ===============================================
 
+def format_admin_block(a):
+    """Render one admin for the admin management list."""
+    is_super = a.get('is_super_admin')
+    badge = "👑" if is_super else "🔹"
+    name = a.get('first_name') or 'Unknown'
+    username = f"@{a['username']}" if a.get('username') else 'no username'
+    return (
+        f"{badge} **{name}** ({username})\n"
+        f"   🆔 `{a['user_id']}`\n"
+        + ("   🛡️ Super Admin\n" if is_super else "")
+        + "─────────────────\n"
+    )
+
 async def admin_manage_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show admin list with add/remove options."""
     if update.effective_user.id not in ADMIN_USER_IDS:
@@ -744,18 +970,14 @@ async def admin_manage_admins(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         text = "👥 **ADMIN MANAGEMENT**\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
         
-        if not admins:
-            text += "No admins found in database.\n"
-        else:
-            for i, a in enumerate(admins, 1):
-                badge = "👑" if a.get('is_super_admin') else "🔹"
-                name = a.get('first_name') or 'Unknown'
-                username = f"@{a['username']}" if a.get('username') else 'no username'
-                text += f"{badge} **{name}** ({username})\n"
-                text += f"   🆔 `{a['user_id']}`\n"
-                if a.get('is_super_admin'):
-                    text += "   🛡️ Super Admin\n"
-                text += "─────────────────\n"
+        # One pass: render each admin and note whether any can be removed
+        has_removable = False
+        blocks = []
+        for a in admins:
+            blocks.append(format_admin_block(a))
+            if not a.get('is_super_admin'):
+                has_removable = True
+        text += "".join(blocks) if blocks else "No admins found in database.\n"
         
         text += f"\n📊 Total Admins: {len(admins)}\n"
         
@@ -764,8 +986,7 @@ async def admin_manage_admins(update: Update, context: ContextTypes.DEFAULT_TYPE
         ]
         
         # Add remove buttons for non-super admins
-        removable = [a for a in admins if not a.get('is_super_admin')]
-        if removable:
+        if has_removable:
             rows.append([InlineKeyboardButton("🗑️ Remove Admin", callback_data="admin_remove_list")])
         
         rows.append([InlineKeyboardButton("◀️ Back", callback_data="admin_admins")])
@@ -773,7 +994,7 @@ async def admin_manage_admins(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         if update.callback_query:
             try:
-                await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+                await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
             except BadRequest as e:
                 # Ignore if message is not modified
                 if "Message is not modified" not in str(e):
@@ -800,10 +1021,10 @@ async def admin_add_admin_prompt(update: Update, context: ContextTypes.DEFAULT_T
         "Ask them to message @userinfobot or check their profile in /start.\n\n"
         "Type the numeric User ID:"
     )
-    reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancel", callback_data="admin_admins")]])
+    reply_markup = get_add_admin_cancel_keyboard()
     
     if update.callback_query:
-        await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+        await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
     else:
         await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
 
@@ -816,8 +1037,7 @@ async def handle_add_admin_input(update: Update, context: ContextTypes.DEFAULT_T
     if not user_text.isdigit():
         await update.message.reply_text(
             "❌ Invalid User ID. Please enter a numeric Telegram User ID.",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔄 Try Again", callback_data="admin_add_admin"),
-                                                InlineKeyboardButton("◀️ Back", callback_data="admin_admins")]])
+            reply_markup=get_add_admin_retry_keyboard()
         )
         return
     
@@ -832,18 +1052,15 @@ async def handle_add_admin_input(update: Update, context: ContextTypes.DEFAULT_T
     success = await db.add_admin(new_admin_id, added_by, username, first_name)
     
     if success:
+        # Also updates the session role if this user is online
         await refresh_admin_list()
-        # Also update session role if this user is online
-        if new_admin_id in user_sessions:
-            user_sessions[new_admin_id].role = "admin"
         
         display_name = first_name or username or str(new_admin_id)
         text = f"✅ **Admin Added!**\n\n👤 **{display_name}** (`{new_admin_id}`)\nis now an admin."
     else:
         text = f"⚠️ User `{new_admin_id}` is already an admin."
     
-    reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("👥 Admin List", callback_data="admin_admins"),
-                                          InlineKeyboardButton("◀️ Menu", callback_data="back_menu")]])
+    reply_markup = get_admin_added_keyboard()
     await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
 
 async def admin_remove_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -856,7 +1073,7 @@ async def admin_remove_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if not removable:
         text = "🗑️ **REMOVE ADMIN**\n\nNo removable admins. Super Admins cannot be removed."
-        reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data="admin_admins")]])
+        reply_markup = get_back_to_admins_button()
     else:
         text = "🗑️ **REMOVE ADMIN**\n━━━━━━━━━━━━━━━━━━━━━━\n\nSelect an admin to remove:\n"
         rows = []
@@ -870,7 +1087,7 @@ async def admin_remove_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup = InlineKeyboardMarkup(rows)
     
     if update.callback_query:
-        await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+        await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
     else:
         await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
 
@@ -904,45 +1121,49 @@ async def user_track_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = get_back_button()
     
     if update.callback_query:
-        await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+        await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
     else:
         await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
 
+USER_PRODUCTS_LIMIT = 15
+
+def format_product_block(p):
+    """Customer-facing catalog entry for one product."""
+    stock_text = "✅ In Stock" if p['stock_quantity'] > 0 else "❌ Out of Stock"
+    block = f"**{p['name']}**\n💰 ৳{p['price']:,.0f} • {stock_text}\n"
+    if p.get('description'):
+        desc = p['description'][:60] + "..." if len(p['description']) > 60 else p['description']
+        block += f"📝 {desc}\n"
+    return block + "─────────────────\n"
+
 async def user_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        # Changed to get ALL active products instead of just featured
-        products = await db.get_all_products(active_only=True)
+        # All active products (not just featured), capped to what fits in one message
+        products = await db.get_all_products(active_only=True, limit=USER_PRODUCTS_LIMIT)
         
-        text = "🛍️ **OUR PRODUCTS**\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
-        
-        if products:
-            for p in products:
-                stock_text = "✅ In Stock" if p['stock_quantity'] > 0 else "❌ Out of Stock"
-                text += f"**{p['name']}**\n"
-                text += f"💰 ৳{p['price']:,.0f} • {stock_text}\n"
-                if p.get('description'):
-                    desc = p['description'][:60] + "..." if len(p['description']) > 60 else p['description']
-                    text += f"📝 {desc}\n"
-                text += "─────────────────\n"
-        else:
-            text += "No products available at the moment.\n"
-
+        footer = ""
         # USE SEARCH AI FOR RECOMMENDATION
         try:
             model = get_ai_model("search")
             ai_prompt = "TASK: Give a very short (20 words), premium fashion tip or recommendation for a customer browsing our traditional collection."
-            ai_response = model.generate_content(ai_prompt)
-            tip = ai_response.text.strip()
-            text += f"\n{tip}\n"
+            ai_response = await model.generate_content_async(ai_prompt)
+            tip = sanitize_markdown(ai_response.text.strip())
+            footer += f"\n{tip}\n"
         except Exception:
             pass
         
-        text += f"\n🌐 Visit our website:\n{CONTACT_INFO['website']}"
+        footer += f"\n🌐 Visit our website:\n{CONTACT_INFO['website']}"
+        
+        header = "🛍️ **OUR PRODUCTS**\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
+        if products:
+            text = render_blocks(header, (format_product_block(p) for p in products), footer)
+        else:
+            text = header + "No products available at the moment.\n" + footer
         
         reply_markup = get_back_button()
         
         if update.callback_query:
-            await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+            await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
         else:
             await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
             
@@ -950,8 +1171,8 @@ async def user_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Products error: {e}")
         await send_error_message(update, "loading products")
 
-async def user_about(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    text = """ℹ️ **ABOUT NONGOR PREMIUM**
+# Static texts rendered once at import (built only from constants above)
+ABOUT_TEXT = """ℹ️ **ABOUT NONGOR PREMIUM**
 
 🌸 Nongor is your destination for premium Bengali cultural fashion and lifestyle products.
 
@@ -971,15 +1192,8 @@ async def user_about(update: Update, context: ContextTypes.DEFAULT_TYPE):
 🌐 Website: {}
 📱 Follow us: {}
 """.format(CONTACT_INFO['website'], CONTACT_INFO['facebook'])
-    
-    reply_markup = get_back_button()
-    
-    if update.callback_query:
-        await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
-    else:
-        await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
 
-async def user_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
+def _build_contact_text():
     contact_lines = ["📱 **CONTACT US**\n", "**Get in Touch:**\n"]
     
     if CONTACT_INFO.get('phone'):
@@ -998,17 +1212,25 @@ async def user_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
     contact_lines.append(f"Messenger: {BUSINESS_HOURS['response_times']['messenger']}")
     contact_lines.append(f"Email: {BUSINESS_HOURS['response_times']['email']}")
     
-    text = "\n".join(contact_lines)
-    
-    reply_markup = get_back_button()
-    
-    if update.callback_query:
-        await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
-    else:
-        await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+    return "\n".join(contact_lines)
 
-async def user_policies(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    text = f"""📜 **POLICIES & INFORMATION**
+CONTACT_TEXT = _build_contact_text()
+
+# wa.me link built once (digits only); None while WhatsApp is not configured
+WHATSAPP_URL = (
+    "https://wa.me/" + "".join(ch for ch in CONTACT_INFO['whatsapp'] if ch.isdigit())
+    if CONTACT_INFO.get('whatsapp') else None
+)
+
+@functools.lru_cache(maxsize=1)
+def get_contact_keyboard():
+    rows = [[InlineKeyboardButton("💬 Messenger", url=CONTACT_INFO['messenger'])]]
+    if WHATSAPP_URL:
+        rows.append([InlineKeyboardButton("📱 WhatsApp Support", url=WHATSAPP_URL)])
+    rows.append([InlineKeyboardButton("◀️ Back to Menu", callback_data="back_menu")])
+    return InlineKeyboardMarkup(rows)
+
+POLICIES_TEXT = f"""📜 **POLICIES & INFORMATION**
 
 **🚚 Shipping:**
 • Dhaka: {DELIVERY_POLICIES['dhaka']['time']} (৳{DELIVERY_POLICIES['dhaka']['charge']})
@@ -1033,11 +1255,31 @@ async def user_policies(update: Update, context: ContextTypes.DEFAULT_TYPE):
 For detailed policies, visit:
 {CONTACT_INFO['website']}/policies
 """
+
+async def user_about(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text = ABOUT_TEXT
+    reply_markup = get_back_button()
     
+    if update.callback_query:
+        await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+    else:
+        await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+
+async def user_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text = CONTACT_TEXT
+    reply_markup = get_contact_keyboard()
+    
+    if update.callback_query:
+        await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+    else:
+        await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+
+async def user_policies(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text = POLICIES_TEXT
     reply_markup = get_back_button()
     
     if update.callback_query:
-        await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+        await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
     else:
         await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
 
@@ -1053,7 +1295,7 @@ async def user_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = get_back_button()
     
     if update.callback_query:
-        await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+        await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
     else:
         await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
 
@@ -1068,18 +1310,19 @@ async def handle_user_search_query(update: Update, context: ContextTypes.DEFAULT
             
         text = f"🔍 **SEARCH RESULTS** ({len(products)} found)\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
         
-        for p in products[:5]:
-            stock_text = "✅ In Stock" if p['stock_quantity'] > 0 else "❌ Out of Stock"
-            text += f"**{p['name']}**\n"
-            text += f"💰 ৳{p['price']:,.0f} • {stock_text}\n"
-            text += f"─────────────────\n"
+        text += "".join(
+            f"**{p['name']}**\n"
+            f"💰 ৳{p['price']:,.0f} • {'✅ In Stock' if p['stock_quantity'] > 0 else '❌ Out of Stock'}\n"
+            "─────────────────\n"
+            for p in products[:5]
+        )
             
         # USE SEARCH AI FOR FASHION INSIGHT
         try:
             model = get_ai_model("search")
             ai_prompt = f"TASK: Act as a premium fashion consultant. A customer is searching for '{search_term}'. Give 1 sentence of expert advice based on Nongor's traditional premium brand (max 15 words)."
-            ai_response = model.generate_content(ai_prompt)
-            insight = ai_response.text.strip()
+            ai_response = await model.generate_content_async(ai_prompt)
+            insight = sanitize_markdown(ai_response.text.strip())
             text += f"\n👤 **Fashion Consultant**: {insight}\n"
         except Exception:
             pass
@@ -1100,7 +1343,7 @@ async def handle_ai_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup = get_back_button()
         
         if update.callback_query:
-            await update.callback_query.edit_message_text(text, reply_markup=reply_markup)
+            await edit_if_changed(update.callback_query, text, reply_markup=reply_markup)
         else:
             await update.message.reply_text(text, reply_markup=reply_markup)
         return
@@ -1116,7 +1359,7 @@ async def handle_ai_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = get_back_button()
     
     if update.callback_query:
-        await update.callback_query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+        await edit_if_changed(update.callback_query, text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
     else:
         await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
 
@@ -1129,48 +1372,35 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     session = get_session(user_id)
     user_text = update.message.text.strip()
     
-    # Handle admin add input
-    if session.state == "waiting_admin_id":
-        await handle_add_admin_input(update, context, user_text)
-        return
-    
-    # Admin: Broadcast Message
-    if session.state == 'waiting_broadcast_msg':
-        await handle_broadcast_message(update, context)
-        return
-    
-    # Handle order ID input
-    if session.state == "waiting_order_id":
-        await handle_order_tracking(update, context, user_text)
-        return
-
-    # Handle search input (Admin)
-    if session.state == "waiting_search":
-        await handle_search_query(update, context, user_text)
-        return
-    
-    # Handle search input (User)
-    if session.state == "waiting_user_search":
-        await handle_user_search_query(update, context, user_text)
-        return
+    # Admin-only states need the role re-checked; it may have been revoked since
+    if session.state in ADMIN_STATES and user_id not in ADMIN_USER_IDS:
+        session.state = "menu"
     
-    # Handle AI chat
-    if session.state == "ai_chat":
-        await handle_ai_message(update, context, user_text)
+    # Route by session state (see STATE_HANDLERS)
+    handler = STATE_HANDLERS.get(session.state)
+    if handler:
+        await handler(update, context, user_text)
         return
     
     # Default: Show menu
     await start(update, context)
 
+# "#NG-63497", "NG-63497", "#63497", "63497" -> numeric ID (int4 range)
+ORDER_ID_RE = re.compile(r'#?(?:NG-)?(\d{1,9})', re.IGNORECASE)
+
 async def handle_order_tracking(update: Update, context: ContextTypes.DEFAULT_TYPE, order_id):
+    # Leave the waiting state before any awaits so a second message isn't routed here again
+    get_session(update.effective_user.id).state = "menu"
+    
     try:
         # Try to find order by order_id string
         order = await db.get_order_by_order_id(order_id)
         
         # If not found, try numeric ID
-        if not order and order_id.replace('#', '').replace('NG-', '').replace('ng-', '').isdigit():
-            numeric_id = int(order_id.replace('#', '').replace('NG-', '').replace('ng-', ''))
-            order = await db.get_order_by_id(numeric_id)
+        if not order:
+            match = ORDER_ID_RE.fullmatch(order_id)
+            if match:
+                order = await db.get_order_by_id(int(match.group(1)))
         
         if not order:
             text = f"❌ Order **{order_id}** not found.\n\nPlease check your order ID and try again."
@@ -1221,8 +1451,8 @@ async def handle_order_tracking(update: Update, context: ContextTypes.DEFAULT_TY
             Example: "Great news, your order is confirmed and being packed with care! 🎁"
             Keep it strictly under 20 words.
             """
-            ai_response = model.generate_content(ai_prompt)
-            reassurance = ai_response.text.strip()
+            ai_response = await model.generate_content_async(ai_prompt)
+            reassurance = sanitize_markdown(ai_response.text.strip())
             text += f"\n\n{reassurance}"
         except Exception as e:
             logger.warning(f"Tracking AI failed: {e}")
@@ -1232,72 +1462,63 @@ async def handle_order_tracking(update: Update, context: ContextTypes.DEFAULT_TY
     except Exception as e:
         logger.error(f"Order tracking error: {e}")
         await update.message.reply_text("❌ Error retrieving order details.", reply_markup=get_back_button())
-    
-    session = get_session(update.effective_user.id)
-    session.state = "menu"
 
 async def handle_search_query(update: Update, context: ContextTypes.DEFAULT_TYPE, search_term):
     if update.effective_user.id not in ADMIN_USER_IDS:
         return
     
+    get_session(update.effective_user.id).state = "menu"
+    
     try:
         results = await db.search_orders(search_term)
         
         if not results:
             text = f"🔍 **SEARCH RESULTS**\n\nNo orders found for: **{search_term}**"
         else:
-            text = f"🔍 **SEARCH RESULTS** ({len(results)} found)\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
-            for o in results[:10]:
-                total = o.get('total_price', 0) or 0
-                status_emoji = get_status_emoji(o.get('status'))
-                text += f"{status_emoji} **{o.get('order_id', 'N/A')}**\n"
-                text += f"👤 {o.get('customer_name', 'Unknown')} • 📱 {o.get('phone', 'N/A')}\n"
-                text += f"💰 ৳{total:,.0f} • {o.get('delivery_status', o.get('status', 'N/A'))}\n"
-                text += "─────────────────\n"
+            blocks = (
+                SEARCH_ORDER_ROW.format(
+                    emoji=get_status_emoji(o.get('status')),
+                    order_id=o.get('order_id', 'N/A'),
+                    customer=o.get('customer_name', 'Unknown'),
+                    phone=o.get('phone', 'N/A'),
+                    total=o.get('total_price', 0) or 0,
+                    delivery=o.get('delivery_status', o.get('status', 'N/A')),
+                )
+                for o in results[:10]
+            )
+            text = render_blocks(f"🔍 **SEARCH RESULTS** ({len(results)} found)\n━━━━━━━━━━━━━━━━━━━━━━\n\n", blocks)
         
         await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=get_back_button())
         
     except Exception as e:
         logger.error(f"Search error: {e}")
         await update.message.reply_text("❌ Error searching orders.", reply_markup=get_back_button())
-    
-    session = get_session(update.effective_user.id)
-    session.state = "menu"
 
-async def handle_ai_message(update: Update, context: ContextTypes.DEFAULT_TYPE, user_text):
-    if not ai_initialized:
-        await update.message.reply_text("🤖 AI is not available.")
-        return
-    
-    session = get_session(update.effective_user.id)
-    
-    # Rate limiting: 5-second cooldown per user
-    if not session.can_use_ai(cooldown_seconds=5):
-        await update.message.reply_text("⏳ Please wait a moment before sending another request.", reply_markup=get_back_button())
-        return
-    session.last_ai_request = datetime.now()
-    
-    try:
-        # Build context
-        if session.role == "admin":
-            # Fetch Advanced Business Data
-            today_stats = await db.get_today_stats()
-            weekly_stats = await db.get_weekly_stats()
-            monthly_stats = await db.get_monthly_stats()
-            top_products = await db.get_top_products(days=30, limit=5)
-            low_stock = await db.get_inventory_alerts()
-            cat_revenue = await db.get_revenue_by_category(days=30)
-            
-            # Format Top Products
-            top_prod_text = "\n".join([f"- {p['product_name']}: ৳{p['revenue']:,.0f} ({p['order_count']} orders)" for p in top_products]) if top_products else "No sales data."
-            
-            # Format Low Stock
-            low_stock_text = "\n".join([f"- {p['name']}: {p['stock_quantity']} left" for p in low_stock]) if low_stock else "Inventory looks healthy."
+AI_CONTEXT_TTL_SECONDS = 120
+_ai_context_cache = {}  # role -> (expires_at, context text)
+
+async def build_ai_context(role):
+    """Assemble the system prompt + live data block for an AI chat role."""
+    if role == "admin":
+        # Fetch Advanced Business Data
+        periods, top_products, low_stock, cat_revenue = await asyncio.gather(
+            db.get_period_stats(),
+            db.get_top_products(days=30, limit=5),
+            db.get_inventory_alerts(),
+            db.get_revenue_by_category(days=30)
+        )
+        today_stats, weekly_stats, monthly_stats = periods['today'], periods['weekly'], periods['monthly']
+        
+        # Format Top Products
+        top_prod_text = "\n".join([f"- {p['product_name']}: ৳{p['revenue']:,.0f} ({p['order_count']} orders)" for p in top_products]) if top_products else "No sales data."
+        
+        # Format Low Stock
+        low_stock_text = "\n".join([f"- {p['name']}: {p['stock_quantity']} left" for p in low_stock]) if low_stock else "Inventory looks healthy."
 
-            # Format Category Performance
-            cat_text = "\n".join([f"- {c['category_name']}: ৳{c['revenue']:,.0f}" for c in cat_revenue]) if cat_revenue else "No category data."
+        # Format Category Performance
+        cat_text = "\n".join([f"- {c['category_name']}: ৳{c['revenue']:,.0f}" for c in cat_revenue]) if cat_revenue else "No category data."
 
-            prompt = f"""{AI_ADMIN_PROMPT}
+        return f"""{AI_ADMIN_PROMPT}
 
 📊 **EXECUTIVE DASHBOARD**:
 
@@ -1313,7 +1534,55 @@ async def handle_ai_message(update: Update, context: ContextTypes.DEFAULT_TYPE,
 {low_stock_text}
 
 **4. 📈 Category Analysis**:
-{cat_text}
+{cat_text}"""
+
+    products_context = await db.get_products_for_context()
+    return f"""{AI_CUSTOMER_PROMPT}
+
+PRODUCT CATALOG CONTEXT:
+{products_context}"""
+
+async def get_ai_context(role):
+    """Cached build_ai_context (refreshed every AI_CONTEXT_TTL_SECONDS)."""
+    now = time.monotonic()
+    cached = _ai_context_cache.get(role)
+    if cached and cached[0] > now:
+        return cached[1]
+    text = await build_ai_context(role)
+    _ai_context_cache[role] = (now + AI_CONTEXT_TTL_SECONDS, text)
+    return text
+
+async def warm_ai_context():
+    """Pre-build both AI contexts so the first chat message doesn't pay for it."""
+    if not ai_initialized:
+        return
+    try:
+        await asyncio.gather(get_ai_context("admin"), get_ai_context("user"))
+        logger.info("AI context cache warmed.")
+    except Exception as e:
+        logger.warning(f"AI context warm-up failed: {e}")
+
+async def handle_ai_message(update: Update, context: ContextTypes.DEFAULT_TYPE, user_text):
+    if not ai_initialized:
+        await update.message.reply_text("🤖 AI is not available.")
+        return
+    
+    session = get_session(update.effective_user.id)
+    
+    # Rate limiting: 5-second cooldown per user
+    if not session.can_use_ai(cooldown_seconds=5):
+        await update.message.reply_text("⏳ Please wait a moment before sending another request.", reply_markup=get_back_button())
+        return
+    session.last_ai_request = datetime.now()
+    
+    # Typing indicator runs alongside context building + model call
+    spawn(send_typing(context, update.effective_chat.id))
+    
+    try:
+        # Build context (cached per role, see get_ai_context)
+        ai_context = await get_ai_context(session.role)
+        if session.role == "admin":
+            prompt = f"""{ai_context}
 
 **Admin Query**: {user_text}
 
@@ -1323,12 +1592,7 @@ Provide a senior-level strategic analysis based on these numbers."""
             model = get_ai_model("admin")
 
         else:
-            products_context = await db.get_products_for_context()
-            
-            prompt = f"""{AI_CUSTOMER_PROMPT}
-
-PRODUCT CATALOG CONTEXT:
-{products_context}
+            prompt = f"""{ai_context}
 
 Customer Query: {user_text}
 
@@ -1338,19 +1602,19 @@ Response:"""
             model = get_ai_model("customer")
         
         try:
-            response = model.generate_content(prompt)
+            response = await model.generate_content_async(prompt)
             ai_text = response.text
         except Exception as e:
             logger.warning(f"Primary AI model failed: {e}. Switching to Fallback.")
             # FALLBACK
             fallback = get_ai_model("fallback")
-            response = fallback.generate_content(prompt)
+            response = await fallback.generate_content_async(prompt)
             ai_text = response.text
 
-        # Limit response length
-        if len(ai_text) > 4000: # Telegram limit is 4096
-            ai_text = ai_text[:3800] + "\n\n_...response trimmed_"
+        # Limit response length (Telegram limit is 4096 UTF-16 units)
+        ai_text = safe_truncate(ai_text)
         
+        # Plain text: model output isn't guaranteed to parse as Markdown, and one send beats a resend
         await update.message.reply_text(ai_text, reply_markup=get_back_button())
         
     except Exception as e:
@@ -1364,34 +1628,7 @@ Response:"""
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    
-    callback_map = {
-        "back_menu": start,
-        "admin_dashboard": admin_dashboard,
-        "admin_analytics": admin_analytics,
-        "admin_orders": admin_orders,
-        "admin_products": admin_products,
-        "admin_coupons": admin_coupons,
-        "admin_search": admin_search,
-        "admin_filter": admin_filter,
-        "admin_export": admin_export,
-        "admin_chart": admin_chart,
-        "admin_monitor": handle_monitor_command,
-        "admin_ai_chat": handle_ai_chat,
-        "admin_admins": admin_manage_admins,
-        "admin_add_admin": admin_add_admin_prompt,
-        "admin_remove_list": admin_remove_list,
-        "admin_broadcast_prompt": admin_broadcast_prompt,
-        "admin_broadcast_confirm": execute_broadcast,
-        "admin_broadcast_cancel": cancel_broadcast,
-        "user_track_order": user_track_order,
-        "user_products": user_products,
-        "user_about": user_about,
-        "user_contact": user_contact,
-        "user_policies": user_policies,
-        "user_ai_chat": handle_ai_chat,
-        "user_search": user_search,
-    }
+    queue_user_save(update.effective_user)
     
     # Handle filter callbacks
     if query.data.startswith("filter_"):
@@ -1403,16 +1640,27 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await handle_remove_admin(update, context)
         return
     
-    handler = callback_map.get(query.data)
+    handler = CALLBACK_HANDLERS.get(query.data)
     if handler:
         await handler(update, context)
     else:
-        await query.edit_message_text("❌ Unknown action")
+        await edit_if_changed(query, "❌ Unknown action")
 
 # ===============================================
 # BROADCAST SYSTEM
 # ===============================================
 
+BROADCAST_CONCURRENCY = 25  # In-flight sends
+BROADCAST_RATE = 25         # Overall msgs/sec, below Telegram's ~30/sec limit
+BROADCAST_BATCH_SIZE = 1000
+
+# broadcast type -> partial send call, completed with chat_id per recipient
+BROADCAST_SENDERS = {
+    'text': lambda bot, d: functools.partial(bot.send_message, text=d['text']),
+    'photo': lambda bot, d: functools.partial(bot.send_photo, photo=d['file_id'], caption=d['caption']),
+    'video': lambda bot, d: functools.partial(bot.send_video, video=d['file_id'], caption=d['caption']),
+}
+
 async def admin_broadcast_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Prompt admin for broadcast message."""
     query = update.callback_query
@@ -1435,9 +1683,9 @@ async def admin_broadcast_prompt(update: Update, context: ContextTypes.DEFAULT_T
         "• Video (with caption)\n\n"
         "Type /cancel to abort."
     )
-    await query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN)
+    await edit_if_changed(query, text, parse_mode=ParseMode.MARKDOWN)
 
-async def handle_broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def handle_broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE, user_text=None):
     """Capture broadcast message content and ask for confirmation."""
     user_id = update.effective_user.id
     
@@ -1462,16 +1710,9 @@ async def handle_broadcast_message(update: Update, context: ContextTypes.DEFAULT
     context.user_data['broadcast_preview'] = broadcast_data
     
     # Get user count
-    all_users = await db.get_all_user_ids()
-    count = len(all_users)
+    count = (await db.get_user_stats())['total_users']
     
-    keyboard = [
-        [
-            InlineKeyboardButton("✅ Send Broadcast", callback_data='admin_broadcast_confirm'),
-            InlineKeyboardButton("❌ Cancel", callback_data='admin_broadcast_cancel')
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = get_broadcast_confirm_keyboard()
     
     msg = (
         f"📢 **Broadcast Preview**\n\n"
@@ -1496,80 +1737,241 @@ async def handle_broadcast_message(update: Update, context: ContextTypes.DEFAULT
 async def execute_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Execute the broadcast loop."""
     query = update.callback_query
+    # Pop before any await so a second tap on "Send" finds nothing to send
+    broadcast_data = context.user_data.pop('broadcast_preview', None)
+    if update.effective_user.id not in ADMIN_USER_IDS:
+        await query.answer("❌ Authorized personnel only.", show_alert=True)
+        return
     await query.answer()
-    
-    broadcast_data = context.user_data.get('broadcast_preview')
     if not broadcast_data:
-        await query.edit_message_text("❌ Session expired. Please start over.")
+        await edit_if_changed(query, "❌ Session expired. Please start over.")
         return
         
-    user_ids = await db.get_all_user_ids()
-    total = len(user_ids)
+    await flush_users()  # Include anyone who joined since the last flush
+    total = (await db.get_user_stats())['total_users']
     sent = 0
     failed = 0
     
-    await query.edit_message_text(f"🚀 **Broadcasting to {total} users...**\nThis may take a while.")
+    await edit_if_changed(query, f"🚀 **Broadcasting to {total} users...**\nThis may take a while.")
+    
+    sem = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    # Resolve the send method + payload once, not per recipient
+    send = BROADCAST_SENDERS[broadcast_data['type']](context.bot, broadcast_data)
     
     # Helper to send (avoids duplicating logic)
     async def send_to_user(uid):
-        try:
-            if broadcast_data['type'] == 'text':
-                await context.bot.send_message(chat_id=uid, text=broadcast_data['text'])
-            elif broadcast_data['type'] == 'photo':
-                await context.bot.send_photo(chat_id=uid, photo=broadcast_data['file_id'], caption=broadcast_data['caption'])
-            elif broadcast_data['type'] == 'video':
-                await context.bot.send_video(chat_id=uid, video=broadcast_data['file_id'], caption=broadcast_data['caption'])
-            return True
-        except Exception:
+        async with sem:
+            for _ in range(2):
+                try:
+                    await send(chat_id=uid)
+                    return True
+                except RetryAfter as e:
+                    # Flood control: wait as told, then retry once
+                    await asyncio.sleep(e.retry_after)
+                except Exception:
+                    return False
+                finally:
+                    # Hold the slot so all slots together send ~BROADCAST_RATE msgs/sec
+                    await asyncio.sleep(BROADCAST_CONCURRENCY / BROADCAST_RATE)
             return False
 
-    # Send loop with rate limiting
-    for uid in user_ids:
-        if await send_to_user(uid):
-            sent += 1
-        else:
-            failed += 1
-        await asyncio.sleep(0.05)  # 20 msgs/sec max (safe limit)
-        
+    # Concurrent sends, one batch at a time to bound pending tasks
+    title = "✅ **Broadcast Complete**"
+    try:
+        async for batch in db.iter_user_id_batches(BROADCAST_BATCH_SIZE):
+            results = await asyncio.gather(*(send_to_user(uid) for uid in batch))
+            ok = sum(results)
+            sent += ok
+            failed += len(batch) - ok
+    except Exception as e:
+        # Reading the user list failed midway: report it instead of a false "Complete"
+        logger.error(f"Broadcast interrupted: {e}")
+        title = "⚠️ **Broadcast Interrupted** (could not load the rest of the user list)"
+
     await context.bot.send_message(
         chat_id=update.effective_chat.id,
-        text=f"✅ **Broadcast Complete**\n\nSent: {sent}\nFailed: {failed}\nTotal: {total}",
+        text=f"{title}\n\nSent: {sent}\nFailed: {failed}\nTotal: {sent + failed} of {total}",
         parse_mode=ParseMode.MARKDOWN
     )
-    context.user_data.pop('broadcast_preview', None)
 
 async def cancel_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Cancel broadcast."""
     query = update.callback_query
     await query.answer("Broadcast cancelled.")
-    await query.edit_message_text("❌ Broadcast cancelled.")
+    await edit_if_changed(query, "❌ Broadcast cancelled.")
     context.user_data.pop('broadcast_preview', None)
 
 # ===============================================
 # HELPER FUNCTIONS
 # ===============================================
 
+STATUS_EMOJI = {
+    "Pending": "⏳",
+    "Processing": "🔄",
+    "Shipped": "🚚",
+    "Delivered": "✅",
+    "Cancelled": "❌",
+    "Returned": "↩️"
+}
+DEFAULT_STATUS_EMOJI = "📦"
+_STATUS_EMOJI_CI = {k.casefold(): v for k, v in STATUS_EMOJI.items()}
+
 def get_status_emoji(status):
-    """Get emoji for order status"""
-    emoji_map = {
-        "Pending": "⏳",
-        "Processing": "🔄",
-        "Shipped": "🚚",
-        "Delivered": "✅",
-        "Cancelled": "❌",
-        "Returned": "↩️"
-    }
-    return emoji_map.get(status, "📦")
+    """Get emoji for order status (exact match first, case-insensitive on miss)"""
+    emoji = STATUS_EMOJI.get(status)
+    if emoji is None and status:
+        emoji = _STATUS_EMOJI_CI.get(str(status).casefold())
+    return emoji or DEFAULT_STATUS_EMOJI
+
+_background_tasks = set()
+
+def _task_done(task):
+    """Drop the reference to a finished background task and log its failure, if any."""
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()!r}")
+
+def spawn(coro):
+    """Fire-and-forget a coroutine, keeping a reference until it finishes."""
+    task = asyncio.create_task(coro, name=getattr(coro, '__qualname__', None))
+    _background_tasks.add(task)
+    task.add_done_callback(_task_done)
+    return task
+
+async def send_typing(context, chat_id):
+    """Show the typing indicator; failures are irrelevant to the reply."""
+    try:
+        await context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+    except Exception:
+        pass
 
 async def send_error_message(update, action):
     """Send standardized error message"""
     text = f"❌ Error {action}. Please try again."
     
     if update.callback_query:
-        await update.callback_query.edit_message_text(text)
+        await edit_if_changed(update.callback_query, text)
     else:
         await update.message.reply_text(text)
 
+ERROR_NOTICE_SECONDS = 30
+ERROR_NOTICE_MAX = 1000
+_error_notices = OrderedDict()  # (chat_id, error text) -> monotonic time of the last notice
+
+async def error_handler(update, context):
+    """Log unhandled errors; tell the user at most once per chat per error every 30s."""
+    logger.error(f"Unhandled error: {context.error}", exc_info=context.error)
+    if not isinstance(update, Update) or not update.effective_message:
+        return
+    key = (update.effective_chat.id, str(context.error)[:100])
+    now = time.monotonic()
+    last = _error_notices.get(key)
+    if last is not None and now - last < ERROR_NOTICE_SECONDS:
+        return  # Same failure just reported here; don't spam the chat
+    _error_notices[key] = now
+    _error_notices.move_to_end(key)
+    if len(_error_notices) > ERROR_NOTICE_MAX:
+        _error_notices.popitem(last=False)
+    try:
+        await update.effective_message.reply_text("❌ Something went wrong. Please try again.")
+    except Exception:
+        pass
+
+# Zero-width chars (ZWJ kept so emoji sequences survive)
+_ZERO_WIDTH_RE = re.compile('[\u200b\u200c\u200e\u200f\ufeff]')
+TRIM_SUFFIX = "\n\n_...response trimmed_"
+
+def utf16_len(text):
+    """Length as Telegram counts it (UTF-16 code units)."""
+    return len(text.encode('utf-16-le')) // 2
+
+def safe_truncate(text, limit=4000):
+    """Strip zero-width chars and trim to `limit` UTF-16 units on a word boundary."""
+    text = _ZERO_WIDTH_RE.sub('', text)
+    if utf16_len(text) <= limit:
+        return text
+    budget = limit - utf16_len(TRIM_SUFFIX)
+    # errors='ignore' drops a surrogate pair split by the cut
+    cut = text.encode('utf-16-le')[:budget * 2].decode('utf-16-le', errors='ignore')
+    boundary = max(cut.rfind(' '), cut.rfind('\n'))
+    if boundary > len(cut) // 2:
+        cut = cut[:boundary]
+    return cut.rstrip() + TRIM_SUFFIX
+
+def is_markdown_balanced(text):
+    """Cheap check that legacy Markdown entity markers (* _ ` [) are paired."""
+    return (
+        text.count('*') % 2 == 0
+        and text.count('_') % 2 == 0
+        and text.count('`') % 2 == 0
+        and text.count('[') <= text.count(']')
+    )
+
+def sanitize_markdown(text):
+    """AI text that can be embedded in a ParseMode.MARKDOWN message without a parse error."""
+    if is_markdown_balanced(text):
+        return text
+    return escape_markdown(text, version=1)
+
+MESSAGE_BUDGET = 3900  # UTF-16 units; headroom under Telegram's 4096
+
+def render_blocks(header, blocks, footer="", limit=MESSAGE_BUDGET):
+    """Write header + blocks + footer, dropping the blocks that would exceed `limit`."""
+    buf = io.StringIO()
+    buf.write(header)
+    size = utf16_len(header) + utf16_len(footer)
+    for block in blocks:
+        size += utf16_len(block)
+        if size > limit:
+            break
+        buf.write(block)
+    buf.write(footer)
+    return buf.getvalue()
+
+LAST_RENDER_MAX = 1024
+_last_render = OrderedDict()  # (chat_id, message_id) -> hash of the last text + keyboard sent
+
+async def edit_if_changed(query, text, parse_mode=None, reply_markup=None):
+    """edit_message_text, skipped when the message already shows this text and keyboard."""
+    message = query.message
+    key = (message.chat_id, message.message_id) if message else None
+    digest = hash((text, parse_mode, reply_markup.to_json() if reply_markup else None))
+    if key and _last_render.get(key) == digest:
+        return
+    try:
+        await query.edit_message_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
+    if key:
+        _last_render[key] = digest
+        _last_render.move_to_end(key)
+        if len(_last_render) > LAST_RENDER_MAX:
+            _last_render.popitem(last=False)
+
+async def notify_admins(bot, text, parse_mode=ParseMode.MARKDOWN):
+    """Send one message to every admin concurrently; failures are logged, not raised."""
+    async def _send(admin_id):
+        try:
+            await bot.send_message(chat_id=admin_id, text=text, parse_mode=parse_mode)
+        except Exception as e:
+            logger.error(f"Failed to notify {admin_id}: {e}")
+    await asyncio.gather(*(_send(admin_id) for admin_id in ADMIN_USER_IDS))
+
+def pack_blocks(blocks, separator="\n", limit=MESSAGE_BUDGET):
+    """Group blocks into as few messages as fit under `limit` (nothing is dropped)."""
+    parts, size = [], 0
+    sep_len = utf16_len(separator)
+    for block in blocks:
+        block_len = utf16_len(block)
+        if parts and size + sep_len + block_len > limit:
+            yield separator.join(parts)
+            parts, size = [], 0
+        size += block_len + (sep_len if parts else 0)
+        parts.append(block)
+    if parts:
+        yield separator.join(parts)
+
 def _create_chart_image(data):
     """Sync helper to generate chart image (runs in executor)."""
     try:
@@ -1612,56 +2014,54 @@ async def generate_sales_chart():
         logger.error(f"Chart generation error: {e}")
         return None
 
-def _create_csv_string(orders):
-    """Sync helper to create CSV string (runs in executor)."""
-    try:
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Header
-        writer.writerow([
-            'Order ID', 'Customer', 'Phone', 'Email', 'Product', 
-            'Quantity', 'Total', 'Status', 'Delivery Status', 
-            'Payment Method', 'Payment Status', 'Coupon', 'Discount', 'Date'
-        ])
-        
-        # Data
-        for o in orders:
-            writer.writerow([
-                o.get('order_id', ''),
-                o.get('customer_name', ''),
-                o.get('phone', ''),
-                o.get('customer_email', ''),
-                o.get('product_name', ''),
-                o.get('quantity', 0),
-                o.get('total_price', 0),
-                o.get('status', ''),
-                o.get('delivery_status', ''),
-                o.get('payment_method', ''),
-                o.get('payment_status', ''),
-                o.get('coupon_code', ''),
-                o.get('discount_amount', 0),
-                o.get('created_at', '')
-            ])
-        
-        return io.BytesIO(output.getvalue().encode('utf-8-sig'))  # UTF-8 with BOM for Excel
-    except Exception as e:
-        logger.error(f"CSV writing error: {e}")
-        return None
+CSV_HEADER = [
+    'Order ID', 'Customer', 'Phone', 'Email', 'Product', 
+    'Quantity', 'Total', 'Status', 'Delivery Status', 
+    'Payment Method', 'Payment Status', 'Coupon', 'Discount', 'Date'
+]
+CSV_BATCH_SIZE = 500
+
+def _order_csv_row(o):
+    """Map an order row to the CSV_HEADER columns."""
+    return [
+        o.get('order_id', ''),
+        o.get('customer_name', ''),
+        o.get('phone', ''),
+        o.get('customer_email', ''),
+        o.get('product_name', ''),
+        o.get('quantity', 0),
+        o.get('total_price', 0),
+        o.get('status', ''),
+        o.get('delivery_status', ''),
+        o.get('payment_method', ''),
+        o.get('payment_status', ''),
+        o.get('coupon_code', ''),
+        o.get('discount_amount', 0),
+        o.get('created_at', '')
+    ]
 
 async def generate_orders_csv():
-    """Generate CSV file of all orders asynchronously."""
-    try:
-        orders = await db.get_all_orders()
-        if not orders:
-            return None
-        
-        # Run blocking CSV writing code in thread pool
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, _create_csv_string, orders)
-    except Exception as e:
-        logger.error(f"CSV generation error: {e}")
+    """
+    Stream all orders into an in-memory CSV file, one DB batch at a time.
+    Returns None when there are no orders; DB errors propagate to the caller.
+    """
+    buf = io.BytesIO()
+    # utf-8-sig writes the BOM Excel needs; rows are encoded as they are written
+    text = io.TextIOWrapper(buf, encoding='utf-8-sig', newline='', write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(CSV_HEADER)
+    
+    count = 0
+    async for batch in db.iter_order_batches(CSV_BATCH_SIZE):
+        writer.writerows(map(_order_csv_row, batch))
+        count += len(batch)
+    
+    text.flush()
+    text.detach()  # keep buf open when the wrapper is collected
+    if not count:
         return None
+    buf.seek(0)
+    return buf
 
 # ===============================================
 # BACKGROUND TASKS
@@ -1671,8 +2071,6 @@ async def generate_orders_csv():
 
 async def daily_report_scheduler(app: Application):
     """Background task to send daily reports at 9:00 PM BD Time (UTC+6)."""
-    from datetime import timedelta, timezone
-    
     logger.info("Starting Daily Report Scheduler...")
     bd_tz = timezone(timedelta(hours=6))
     
@@ -1688,26 +2086,32 @@ async def daily_report_scheduler(app: Application):
 async def send_daily_report(app: Application):
     """Generates and sends the daily report."""
     try:
-        today = await db.get_today_stats()
-        weekly = await db.get_weekly_stats()
-        top_products = await db.get_top_products(days=1, limit=3)
+        periods, top_products = await asyncio.gather(
+            db.get_period_stats(),
+            db.get_top_products(days=1, limit=3)
+        )
+        today, weekly = periods['today'], periods['weekly']
         
         date_str = datetime.now().strftime('%Y-%m-%d')
         
-        report_text = f"📊 **DAILY BUSINESS REPORT** ({date_str})\n"
-        report_text += "═══════════════════════════════\n\n"
-        report_text += "**TODAY'S PERFORMANCE:**\n"
-        report_text += f"📦 Orders: {today.get('order_count', 0)}\n"
-        report_text += f"💰 Revenue: ৳{today.get('total_revenue', 0):,.2f}\n"
-        report_text += f"📊 Avg Order: ৳{today.get('avg_order_value', 0):,.2f}\n\n"
-        report_text += "**WEEKLY SUMMARY:**\n"
-        report_text += f"📦 Orders: {weekly.get('order_count', 0)}\n"
-        report_text += f"💰 Revenue: ৳{weekly.get('total_revenue', 0):,.2f}\n"
+        parts = [
+            f"📊 **DAILY BUSINESS REPORT** ({date_str})\n",
+            "═══════════════════════════════\n\n",
+            "**TODAY'S PERFORMANCE:**\n",
+            f"📦 Orders: {today.get('order_count', 0)}\n",
+            f"💰 Revenue: ৳{today.get('total_revenue', 0):,.2f}\n",
+            f"📊 Avg Order: ৳{today.get('avg_order_value', 0):,.2f}\n\n",
+            "**WEEKLY SUMMARY:**\n",
+            f"📦 Orders: {weekly.get('order_count', 0)}\n",
+            f"💰 Revenue: ৳{weekly.get('total_revenue', 0):,.2f}\n",
+        ]
         
         if top_products:
-            report_text += "\n**🏆 TOP PRODUCTS TODAY:**\n"
-            for i, p in enumerate(top_products, 1):
-                report_text += f"{i}. {p['product_name']}: ৳{p.get('revenue', 0):,.0f}\n"
+            parts.append("\n**🏆 TOP PRODUCTS TODAY:**\n")
+            parts.extend(
+                f"{i}. {p['product_name']}: ৳{p.get('revenue', 0):,.0f}\n"
+                for i, p in enumerate(top_products, 1)
+            )
         
         # USE REPORT AI FOR STRATEGIC INSIGHT
         try:
@@ -1720,17 +2124,13 @@ async def send_daily_report(app: Application):
             Example: "💼 **Strategic Insight**: Strong revenue today; consider a flash sale on accessories to boost average order value."
             Keep it strictly under 25 words.
             """
-            ai_response = model.generate_content(ai_prompt)
-            insight = ai_response.text.strip()
-            report_text += f"\n{insight}"
+            ai_response = await model.generate_content_async(ai_prompt)
+            insight = sanitize_markdown(ai_response.text.strip())
+            parts.append(f"\n{insight}")
         except Exception as e:
             logger.warning(f"Daily Report AI failed: {e}")
 
-        for admin_id in ADMIN_USER_IDS:
-            try:
-                await app.bot.send_message(chat_id=admin_id, text=report_text, parse_mode=ParseMode.MARKDOWN)
-            except Exception as e:
-                logger.error(f"Failed to send report to {admin_id}: {e}")
+        await notify_admins(app.bot, "".join(parts))
     except Exception as e:
         logger.error(f"Report Generation Error: {e}")
 
@@ -1750,14 +2150,14 @@ async def backup_scheduler(app: Application):
         
         # Execute Backup
         try:
-            data = await db.get_data_dump()
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"backup_{timestamp}.json"
             zip_filename = f"backup_{timestamp}.zip"
-            
-            # Write JSON
+
+            # Write the JSON text PostgreSQL produces straight to disk
             with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, default=str)
+                async for chunk in db.iter_data_dump():
+                    f.write(chunk)
                 
             # Zip it
             with zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_DEFLATED) as zipf:
@@ -1782,8 +2182,27 @@ async def backup_scheduler(app: Application):
         except Exception as e:
             logger.error(f"Backup Error: {e}")
 
+_orders_changed = asyncio.Event()  # Set by the order_changed NOTIFY to wake poll_orders_loop
+
+def on_order_changed(connection, pid, channel, payload):
+    """NOTIFY handler: drop cached aggregates and check for new orders right away."""
+    db.invalidate_cache()
+    _ai_context_cache.clear()
+    _orders_changed.set()
+
+# Cached Database readers whose results come from the products table
+PRODUCT_CACHED_METHODS = (
+    'get_all_products', 'get_low_stock_products', 'get_inventory_alerts',
+    'get_dashboard_bundle', 'get_revenue_by_category',
+)
+
+def on_product_changed(connection, pid, channel, payload):
+    """NOTIFY handler: drop cached product listings and the AI catalog context."""
+    db.invalidate_cache(*PRODUCT_CACHED_METHODS)
+    _ai_context_cache.clear()
+
 async def poll_orders_loop(app: Application):
-    """Check for new orders every minute and notify admins."""
+    """Check for new orders (on NOTIFY, or every minute) and notify admins."""
     logger.info("Starting Order Polling Loop...")
     last_id = await db.get_latest_order_id()
     
@@ -1806,7 +2225,12 @@ async def poll_orders_loop(app: Application):
                 ORDER BY id ASC
             """
             new_orders = await db.fetch_all(query, [last_id])
+            if new_orders:
+                # New sales invalidate the cached dashboard aggregates
+                db.invalidate_cache()
+                _ai_context_cache.clear()
             
+            alerts = []
             for order in new_orders:
                 last_id = order['id']
                 total = order.get('total_price', 0) or 0
@@ -1824,52 +2248,64 @@ async def poll_orders_loop(app: Application):
                 if order.get('coupon_code'):
                     msg += f"🎟️ Coupon: {order['coupon_code']} (-৳{order.get('discount_amount', 0):,.0f})\n"
                 
-                msg += f"\n⏰ {order.get('created_at', datetime.now()).strftime('%Y-%m-%d %H:%M')}\n"
-                
-                for admin_id in ADMIN_USER_IDS:
-                    try:
-                        await app.bot.send_message(chat_id=admin_id, text=msg, parse_mode=ParseMode.MARKDOWN)
-                    except Exception as e:
-                        logger.error(f"Failed to notify {admin_id}: {e}")
+                created = order['created_at'].strftime('%Y-%m-%d %H:%M') if order.get('created_at') else datetime.now().strftime('%Y-%m-%d %H:%M')
+                msg += f"\n⏰ {created}\n"
+                alerts.append(msg)
+            
+            # One message per admin for a burst of orders instead of one per order
+            for text in pack_blocks(alerts, separator="\n─────────────────\n"):
+                await notify_admins(app.bot, text)
         except Exception as e:
             logger.error(f"Polling Error: {e}")
         
-        await asyncio.sleep(60)  # Check every minute
+        # Woken early by on_order_changed; the timeout is the fallback when LISTEN is unavailable
+        try:
+            await asyncio.wait_for(_orders_changed.wait(), timeout=60)
+        except asyncio.TimeoutError:
+            pass
+        _orders_changed.clear()
+
+WEBSITE_STATUS_TTL_SECONDS = 30
+_website_status_cache = {}  # 'status' -> (expires_at, (status_code, latency_ms))
+_monitor_client = None  # Shared keep-alive client for website probes
+
+def get_monitor_client():
+    """Lazily create the httpx client used by probe_website."""
+    global _monitor_client
+    if _monitor_client is None:
+        _monitor_client = httpx.AsyncClient(timeout=10.0)
+    return _monitor_client
+
+async def probe_website(fresh=False):
+    """Return (status_code, latency_ms) for WEBSITE_URL, reusing a recent probe unless fresh."""
+    cached = _website_status_cache.get('status')
+    if not fresh and cached and cached[0] > time.monotonic():
+        return cached[1]
+    start = time.monotonic()
+    resp = await get_monitor_client().get(WEBSITE_URL)
+    result = (resp.status_code, (time.monotonic() - start) * 1000)
+    _website_status_cache['status'] = (time.monotonic() + WEBSITE_STATUS_TTL_SECONDS, result)
+    return result
 
 async def monitor_website_job(context: ContextTypes.DEFAULT_TYPE):
     """Background job to check website status"""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(WEBSITE_URL)
-            status = response.status_code
-            
-            # If status is not 200, ALERT ADMINS
-            if status != 200:
-                for admin_id in ADMIN_USER_IDS:
-                    try:
-                        await context.bot.send_message(
-                            chat_id=admin_id,
-                            text=f"🚨 **CRITICAL ALERT**: Website is DOWN!\n\nStatus Code: {status}\nURL: {WEBSITE_URL}",
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-                    except Exception:
-                        pass
-            else:
-                # Optional: Log success silently
-                logger.info(f"Website Monitor: {WEBSITE_URL} is UP (200 OK)")
+        status, _ = await probe_website(fresh=True)
+        
+        # If status is not 200, ALERT ADMINS
+        if status != 200:
+            await notify_admins(
+                context.bot,
+                f"🚨 **CRITICAL ALERT**: Website is DOWN!\n\nStatus Code: {status}\nURL: {WEBSITE_URL}"
+            )
+        else:
+            # Optional: Log success silently
+            logger.info(f"Website Monitor: {WEBSITE_URL} is UP (200 OK)")
 
     except Exception as e:
         logger.error(f"Website Monitor Error: {e}")
         # Notify admin of monitoring failure
-        for admin_id in ADMIN_USER_IDS:
-            try:
-                await context.bot.send_message(
-                    chat_id=admin_id,
-                    text=f"⚠️ **Monitor Alert**: Could not reach website.\nError: {str(e)}",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            except Exception:
-                pass
+        await notify_admins(context.bot, f"⚠️ **Monitor Alert**: Could not reach website.\nError: {str(e)}")
 
 
 async def handle_monitor_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1881,37 +2317,34 @@ async def handle_monitor_command(update: Update, context: ContextTypes.DEFAULT_T
     args = context.args if update.message else None
     
     if not args:
-        # Check status NOW
-        async with httpx.AsyncClient() as client:
-            try:
-                start = datetime.now()
-                resp = await client.get(WEBSITE_URL)
-                duration = (datetime.now() - start).total_seconds() * 1000
-                status_emoji = "✅" if resp.status_code == 200 else "❌"
-                
-                text = (
-                    f"{status_emoji} **Website Status**\n"
-                    f"URL: {WEBSITE_URL}\n"
-                    f"Code: `{resp.status_code}`\n"
-                    f"Latency: `{duration:.0f}ms`\n\n"
-                    "Use `/monitor on` to enable auto-alerts."
+        # Check status (probe results are reused for a few seconds)
+        try:
+            status_code, duration = await probe_website()
+            status_emoji = "✅" if status_code == 200 else "❌"
+            
+            text = (
+                f"{status_emoji} **Website Status**\n"
+                f"URL: {WEBSITE_URL}\n"
+                f"Code: `{status_code}`\n"
+                f"Latency: `{duration:.0f}ms`\n\n"
+                "Use `/monitor on` to enable auto-alerts."
+            )
+            
+            if update.callback_query:
+                await edit_if_changed(update.callback_query, 
+                    text, 
+                    parse_mode=ParseMode.MARKDOWN,
+                    reply_markup=get_back_button()
                 )
-                
-                if update.callback_query:
-                    await update.callback_query.edit_message_text(
-                        text, 
-                        parse_mode=ParseMode.MARKDOWN,
-                        reply_markup=get_back_button()
-                    )
-                else:
-                    await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
-
-            except Exception as e:
-                error_text = f"❌ Connection Failed: {e}"
-                if update.callback_query:
-                    await update.callback_query.edit_message_text(error_text, reply_markup=get_back_button())
-                else:
-                    await update.message.reply_text(error_text)
+            else:
+                await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+
+        except Exception as e:
+            error_text = f"❌ Connection Failed: {e}"
+            if update.callback_query:
+                await edit_if_changed(update.callback_query, error_text, reply_markup=get_back_button())
+            else:
+                await update.message.reply_text(error_text)
         return
 
     action = args[0].lower()
@@ -1936,6 +2369,77 @@ async def handle_monitor_command(update: Update, context: ContextTypes.DEFAULT_T
     else:
         await update.message.reply_text("Usage: `/monitor` (check once), `/monitor on`, `/monitor off`")
 
+# ===============================================
+# MESSAGE & CALLBACK ROUTING
+# ===============================================
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Run updates from different chats concurrently, but one at a time within a chat,
+    so messages, commands and button taps in a chat never race each other.
+    """
+
+    def __init__(self, max_concurrent_updates=256):
+        super().__init__(max_concurrent_updates)
+        # Weak values: a lock disappears once no update is holding or waiting on it
+        self._chat_locks = weakref.WeakValueDictionary()
+
+    async def do_process_update(self, update, coroutine):
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            await coroutine
+            return
+        lock = self._chat_locks.get(chat.id)
+        if lock is None:
+            lock = self._chat_locks[chat.id] = asyncio.Lock()
+        async with lock:
+            await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+# session.state -> handler(update, context, user_text)
+STATE_HANDLERS = {
+    "waiting_admin_id": handle_add_admin_input,         # Admin: add admin input
+    "waiting_broadcast_msg": handle_broadcast_message,  # Admin: broadcast message
+    "waiting_order_id": handle_order_tracking,          # Order ID input
+    "waiting_search": handle_search_query,              # Search input (Admin)
+    "waiting_user_search": handle_user_search_query,    # Search input (User)
+    "ai_chat": handle_ai_message,                       # AI chat
+}
+
+# callback_data -> handler(update, context); prefix callbacks are handled in handle_callback
+CALLBACK_HANDLERS = {
+    "back_menu": start,
+    "admin_dashboard": admin_dashboard,
+    "admin_analytics": admin_analytics,
+    "admin_orders": admin_orders,
+    "admin_products": admin_products,
+    "admin_coupons": admin_coupons,
+    "admin_search": admin_search,
+    "admin_filter": admin_filter,
+    "admin_export": admin_export,
+    "admin_chart": admin_chart,
+    "admin_monitor": handle_monitor_command,
+    "admin_ai_chat": handle_ai_chat,
+    "admin_admins": admin_manage_admins,
+    "admin_add_admin": admin_add_admin_prompt,
+    "admin_remove_list": admin_remove_list,
+    "admin_broadcast_prompt": admin_broadcast_prompt,
+    "admin_broadcast_confirm": execute_broadcast,
+    "admin_broadcast_cancel": cancel_broadcast,
+    "user_track_order": user_track_order,
+    "user_products": user_products,
+    "user_about": user_about,
+    "user_contact": user_contact,
+    "user_policies": user_policies,
+    "user_ai_chat": handle_ai_chat,
+    "user_search": user_search,
+}
+
 # ===============================================
 # MAIN
 # ===============================================
@@ -1944,27 +2448,61 @@ async def post_init(application: Application):
     """Post-initialization hook to start background tasks."""
     logger.info("Starting background tasks...")
     
-    # Seed super admins from .env and load full admin list from DB
     await db.connect()
+    await db.listen("order_changed", on_order_changed)
+    await db.listen("product_changed", on_product_changed)
+    
+    # Independent warm-ups run while the admin list is being seeded
+    spawn(warm_ai_context())
+    spawn(poll_orders_loop(application))
+    spawn(session_flush_loop())
+    
+    # Seed super admins from .env and load full admin list from DB
     await db.seed_super_admins(ENV_ADMIN_IDS)
     await refresh_admin_list()
     
     # Removed redundant monitor_website task
     # To enable monitoring: use /monitor on command
-    asyncio.create_task(daily_report_scheduler(application))
-    asyncio.create_task(backup_scheduler(application))
-    asyncio.create_task(poll_orders_loop(application))
+    spawn(daily_report_scheduler(application))
+    spawn(backup_scheduler(application))
     logger.info("✅ Background tasks started.")
 
+async def post_shutdown(application: Application):
+    """Write any users still queued for the users table, then close pools and clients."""
+    await flush_users()
+    await db.close()
+    if _monitor_client is not None:
+        await _monitor_client.aclose()
+
 def main():
     """Start the bot."""
     logger.info("Starting Nongor Bot (Enhanced Version)...")
     
+    # Must be set before run_polling()/run_webhook() creates the event loop
+    if UVLOOP_AVAILABLE:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logger.info("Using uvloop event loop.")
+    
+    # HTTP/2 keeps one multiplexed TLS session to the Bot API for all calls
+    request = HTTPXRequest(
+        connection_pool_size=32,
+        http_version="2",
+        read_timeout=30,
+        write_timeout=30,
+        connect_timeout=10,
+        pool_timeout=10
+    )
+    updates_request = HTTPXRequest(connection_pool_size=4, http_version="2")
+    
     # Build application with post_init hook
     application = (
         Application.builder()
         .token(TELEGRAM_BOT_TOKEN)
+        .request(request)
+        .get_updates_request(updates_request)
         .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .concurrent_updates(PerChatUpdateProcessor())  # A slow chat no longer holds up everyone else
         .build()
     )
     
@@ -1986,13 +2524,31 @@ def main():
     # Callback and message handlers
     application.add_handler(CallbackQueryHandler(handle_callback))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-    
-    logger.info("✅ Bot configured successfully!")
-    logger.info(f"👥 Admin User IDs: {ADMIN_USER_IDS}")
-    logger.info(f"🤖 AI Enabled: {ai_initialized}")
-    
-    # Run bot
-    application.run_polling()
+    application.add_error_handler(error_handler)
+    
+    logger.info("\n".join([
+        "✅ Bot configured successfully!",
+        f"👥 Admin User IDs: {set(ADMIN_USER_IDS)}",
+        f"🤖 AI Enabled: {ai_initialized}",
+    ]))
+    
+    allowed_updates = [Update.MESSAGE, Update.CALLBACK_QUERY]
+    if WEBHOOK_URL:
+        # Telegram pushes updates to us; no getUpdates round trips
+        logger.info(f"🌐 Webhook mode on port {PORT}")
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=PORT,
+            url_path=TELEGRAM_BOT_TOKEN,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{TELEGRAM_BOT_TOKEN}",
+            allowed_updates=allowed_updates
+        )
+    else:
+        # Local dev: 30s long polls (fewer getUpdates round trips)
+        application.run_polling(
+            timeout=30,
+            allowed_updates=allowed_updates
+        )
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,90 @@
+"""
+SQLite Session Store
+Persists bot user sessions (WAL mode) so restarts don't reset conversation state
+"""
+import json
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+class SessionStore:
+    """
+    Small SQLite-backed store for UserSession snapshots.
+    Writes are batched: callers collect rows and hand them to save_many().
+    """
+
+    def __init__(self, path="sessions.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit mode; explicit BEGIN/COMMIT around batched writes
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                first_name TEXT,
+                state TEXT,
+                temp_data TEXT,
+                last_activity TEXT
+            )
+        """)
+        # Separate read connection: WAL lets lookups run while a flush holds the writer
+        self._read_lock = threading.Lock()
+        self.read_conn = sqlite3.connect(path, check_same_thread=False)
+        logger.info(f"Session store ready ({path}).")
+
+    def load(self, user_id):
+        """Load a stored session row as a dict, or None if missing."""
+        with self._read_lock:
+            row = self.read_conn.execute(
+                "SELECT user_id, username, first_name, state, temp_data, last_activity "
+                "FROM sessions WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+        if not row:
+            return None
+        try:
+            temp_data = json.loads(row[4]) if row[4] else {}
+        except ValueError:
+            temp_data = {}
+        return {
+            'user_id': row[0],
+            'username': row[1],
+            'first_name': row[2],
+            'state': row[3],
+            'temp_data': temp_data,
+            'last_activity': row[5],
+        }
+
+    def save_many(self, rows):
+        """Upsert (user_id, username, first_name, state, temp_data, last_activity) rows in one transaction."""
+        if not rows:
+            return
+        with self._lock:
+            try:
+                self.conn.execute("BEGIN")
+                self.conn.executemany("""
+                    INSERT INTO sessions (user_id, username, first_name, state, temp_data, last_activity)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        username = excluded.username,
+                        first_name = excluded.first_name,
+                        state = excluded.state,
+                        temp_data = excluded.temp_data,
+                        last_activity = excluded.last_activity
+                """, rows)
+                self.conn.execute("COMMIT")
+            except Exception as e:
+                self.conn.execute("ROLLBACK")
+                logger.error(f"Session store write failed: {e}")
+
+    def close(self):
+        """Close the SQLite connections."""
+        with self._read_lock:
+            self.read_conn.close()
+        with self._lock:
+            self.conn.close()
@@ -78,9 +78,20 @@ CREATE TABLE IF NOT EXISTS admins (
 );
 
 -- Create indexes for better query performance
-CREATE INDEX IF NOT EXISTS idx_orders_phone ON orders(phone);
-CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
-CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at DESC);
+-- Replacement indexes on the live orders table are built CONCURRENTLY before the old
+-- index is dropped, so lookups never run unindexed and writes aren't blocked
+-- (CONCURRENTLY cannot run inside a transaction block: apply this file statement by statement)
+-- Phone lookups always want the newest orders first; replaces the plain phone index
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_phone_created ON orders(phone, created_at DESC);
+DROP INDEX CONCURRENTLY IF EXISTS idx_orders_phone;
+-- Status filters list newest first; replaces the plain status index
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_status_created ON orders(status, created_at DESC);
+DROP INDEX CONCURRENTLY IF EXISTS idx_orders_status;
+-- Sales window aggregates (period stats, top products, daily chart) read only these
+-- columns, so they can run as index-only scans; replaces the plain created_at index
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_created_covering ON orders(created_at DESC)
+    INCLUDE (status, total_price, quantity, product_name);
+DROP INDEX CONCURRENTLY IF EXISTS idx_orders_created_at;
 CREATE INDEX IF NOT EXISTS idx_orders_product_name ON orders(product_name);
 CREATE INDEX IF NOT EXISTS idx_orders_order_id ON orders(order_id);
 CREATE INDEX IF NOT EXISTS idx_orders_delivery_status ON orders(delivery_status);
@@ -88,3 +99,29 @@ CREATE INDEX IF NOT EXISTS idx_users_last_seen ON users(last_seen DESC);
 CREATE INDEX IF NOT EXISTS idx_products_active ON products(is_active);
 CREATE INDEX IF NOT EXISTS idx_products_category ON products(category_name);
 CREATE INDEX IF NOT EXISTS idx_coupons_code ON coupons(code);
+
+-- Notify the bot when orders change so it can drop cached stats immediately
+CREATE OR REPLACE FUNCTION notify_order_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('order_changed', NEW.id::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS orders_notify_changed ON orders;
+CREATE TRIGGER orders_notify_changed
+    AFTER INSERT OR UPDATE ON orders
+    FOR EACH ROW EXECUTE FUNCTION notify_order_changed();
+
+-- Notify the bot when products change so listings and the AI catalog refresh immediately
+CREATE OR REPLACE FUNCTION notify_product_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('product_changed', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS products_notify_changed ON products;
+CREATE TRIGGER products_notify_changed
+    AFTER INSERT OR UPDATE OR DELETE ON products
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_product_changed();
@@ -6,6 +6,7 @@ Test if we can connect to your Neon database and see what data exists.
 
 import asyncpg
 import asyncio
+import json
 import os
 from dotenv import load_dotenv
 
@@ -31,14 +32,23 @@ async def quick_test():
             ORDER BY table_name
         """)
         
+        # Count rows of every table in one round trip
+        counts = {}
+        if tables:
+            count_query = " UNION ALL ".join(
+                f"SELECT '{t['table_name']}' AS table_name, COUNT(*) AS row_count FROM \"{t['table_name']}\""
+                for t in tables
+            )
+            try:
+                counts = {r['table_name']: r['row_count'] for r in await conn.fetch(count_query)}
+            except Exception:
+                pass
+        
         for table in tables:
             table_name = table['table_name']
-            
-            # Count rows
-            try:
-                count = await conn.fetchval(f"SELECT COUNT(*) FROM {table_name}")
-                print(f"   ✓ {table_name}: {count} rows")
-            except:
+            if table_name in counts:
+                print(f"   ✓ {table_name}: {counts[table_name]} rows")
+            else:
                 print(f"   ✓ {table_name}")
         
         print("\n📊 Sample Data:\n")
@@ -46,26 +56,33 @@ async def quick_test():
         # Try to get sample from common tables
         common_tables = ['orders', 'products', 'customers', 'users']
         
-        for table_name in common_tables:
-            # Check if table exists
-            exists = any(t['table_name'] == table_name for t in tables)
+        table_names = {t['table_name'] for t in tables}
+        present = [name for name in common_tables if name in table_names]
+        
+        # First row of each table in one round trip (rows as JSON since columns differ)
+        samples = {}
+        if present:
+            sample_query = " UNION ALL ".join(
+                f"(SELECT '{name}' AS table_name, row_to_json(t)::text AS row FROM \"{name}\" t LIMIT 1)"
+                for name in present
+            )
+            samples = {r['table_name']: json.loads(r['row']) for r in await conn.fetch(sample_query)}
+        
+        for table_name in present:
+            print(f"🔸 {table_name.upper()} (first row):")
+            
+            row = samples.get(table_name)
             
-            if exists:
-                print(f"🔸 {table_name.upper()} (first row):")
-                
-                # Get first row
-                row = await conn.fetchrow(f"SELECT * FROM {table_name} LIMIT 1")
-                
-                if row:
-                    for key, value in dict(row).items():
-                        # Truncate long values
-                        val_str = str(value)
-                        if len(val_str) > 60:
-                            val_str = val_str[:57] + "..."
-                        print(f"   {key}: {val_str}")
-                    print()
-                else:
-                    print(f"   (Table is empty)\n")
+            if row:
+                for key, value in row.items():
+                    # Truncate long values
+                    val_str = str(value)
+                    if len(val_str) > 60:
+                        val_str = val_str[:57] + "..."
+                    print(f"   {key}: {val_str}")
+                print()
+            else:
+                print(f"   (Table is empty)\n")
         
         # Get column details for coupons
         if any(t['table_name'] == 'coupons' for t in tables):